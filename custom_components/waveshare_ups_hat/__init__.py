@@ -2,45 +2,211 @@
 
 from __future__ import annotations
 
+import asyncio
 from datetime import timedelta
 import logging
 
 import voluptuous as vol
 
-from homeassistant.const import CONF_NAME, CONF_UNIQUE_ID, Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.const import (
+    CONF_MAXIMUM,
+    CONF_MINIMUM,
+    CONF_NAME,
+    CONF_UNIQUE_ID,
+    EVENT_HOMEASSISTANT_STOP,
+    Platform,
+)
+from homeassistant.core import (
+    Event,
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.discovery import async_load_platform
 from homeassistant.helpers.typing import ConfigType
 
 from .const import (
+    ATTR_END,
+    ATTR_START,
+    CONF_ABSOLUTE,
+    CONF_ADAPTIVE_INTERVAL,
     CONF_ADDR,
+    CONF_BUS,
+    CONF_CAPTURE,
+    CONF_CELLS,
+    CONF_CURRENT_RATE,
+    CONF_DEADBAND,
+    CONF_EMULATOR,
+    CONF_ERROR_RATE,
+    CONF_EXTERNAL_STATISTICS,
+    CONF_HEARTBEAT,
+    CONF_HISTORY_SIZE,
+    CONF_LATENCY,
+    CONF_LATENCY_BUDGET,
+    CONF_MAX_AGE,
+    CONF_OPENMETRICS,
+    CONF_OVERSAMPLING_RATE,
+    CONF_POWER_WATCH_INTERVAL,
+    CONF_REFRESH,
+    CONF_RELATIVE,
     CONF_SCAN_INTERVAL,
+    CONF_SCENARIO,
+    CONF_SPEED,
+    CONF_VOLTAGE_RATE,
     DEFAULT_ADDR,
+    DEFAULT_BUS,
     DEFAULT_NAME,
     DEFAULT_UNIQUE_ID,
     DOMAIN,
+    SERVICE_DUMP_DIAGNOSTICS,
+    SERVICE_EXPORT_HISTORY,
+    SERVICE_SHUTDOWN,
+)
+from .bus import UpsHatEBus
+from .coordinator import (
+    CHANNELS,
+    DATA_KEYS,
+    REFRESH_GROUPS,
+    UpsHatECoordinator,
+    create_bus,
 )
-from .coordinator import UpsHatECoordinator
+from .emulator import SCENARIOS
 
 _LOGGER = logging.getLogger(__name__)
 
-PLATFORMS = [Platform.BINARY_SENSOR, Platform.SENSOR]
+PLATFORMS = [Platform.BINARY_SENSOR, Platform.BUTTON, Platform.SENSOR]
 
-CONFIG_SCHEMA = vol.Schema(
+DEADBAND_SCHEMA = vol.Schema(
     {
-        DOMAIN: vol.Schema(
-            {
-                vol.Optional(CONF_ADDR, default=DEFAULT_ADDR): cv.string,
-                vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
-                vol.Optional(CONF_UNIQUE_ID, default=DEFAULT_UNIQUE_ID): cv.string,
-                vol.Optional(CONF_SCAN_INTERVAL, default=30): int,
-            }
-        )
-    },
+        vol.Optional(CONF_ABSOLUTE, default=0): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+        vol.Optional(CONF_RELATIVE, default=0): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+    }
+)
+
+
+def _ordered_bounds(value: ConfigType) -> ConfigType:
+    """Validate that the minimum does not exceed the maximum."""
+    if value[CONF_MINIMUM] > value[CONF_MAXIMUM]:
+        raise vol.Invalid("minimum must not exceed maximum")
+    return value
+
+
+ADAPTIVE_INTERVAL_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(CONF_MINIMUM, default=5): vol.All(int, vol.Range(min=1)),
+            vol.Optional(CONF_MAXIMUM, default=300): vol.All(int, vol.Range(min=1)),
+            vol.Optional(CONF_VOLTAGE_RATE, default=0.1): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+            vol.Optional(CONF_CURRENT_RATE, default=200): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+        }
+    ),
+    _ordered_bounds,
+)
+
+
+def _address(value: str) -> str:
+    """Validate an I2C address such as 0x2d or 45."""
+    try:
+        int(value, 0)
+    except ValueError as e:
+        raise vol.Invalid(f"invalid I2C address {value}") from e
+    return value
+
+
+def _unique_devices(devices: list[ConfigType]) -> list[ConfigType]:
+    """Validate that no two devices share a unique_id or a bus address.
+
+    An emulated bus has no real devices, so either every device on a bus
+    is emulated or none is.
+    """
+    unique_ids = [device[CONF_UNIQUE_ID] for device in devices]
+    if len(set(unique_ids)) != len(unique_ids):
+        raise vol.Invalid("every device needs its own unique_id")
+    addresses = [(device[CONF_BUS], int(device[CONF_ADDR], 0)) for device in devices]
+    if len(set(addresses)) != len(addresses):
+        raise vol.Invalid("every device on a bus needs its own addr")
+    emulated = {(device[CONF_BUS], CONF_EMULATOR in device) for device in devices}
+    if len(emulated) != len({bus for bus, _ in emulated}):
+        raise vol.Invalid("either every device on a bus has an emulator or none")
+    return devices
+
+
+EMULATOR_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_SCENARIO, default="idle"): vol.In(SCENARIOS),
+        vol.Optional(CONF_SPEED, default=1): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+        vol.Optional(CONF_LATENCY, default=0): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+        vol.Optional(CONF_ERROR_RATE, default=0): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=1)
+        ),
+    }
+)
+
+DEVICE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_BUS, default=DEFAULT_BUS): cv.positive_int,
+        vol.Optional(CONF_ADDR, default=DEFAULT_ADDR): vol.All(cv.string, _address),
+        vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
+        vol.Optional(CONF_UNIQUE_ID, default=DEFAULT_UNIQUE_ID): cv.string,
+        vol.Optional(CONF_SCAN_INTERVAL, default=30): int,
+        vol.Optional(CONF_ADAPTIVE_INTERVAL): ADAPTIVE_INTERVAL_SCHEMA,
+        vol.Optional(CONF_OVERSAMPLING_RATE, default=0): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=50)
+        ),
+        vol.Optional(CONF_POWER_WATCH_INTERVAL, default=0.5): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=10)
+        ),
+        vol.Optional(CONF_DEADBAND, default={}): {vol.In(DATA_KEYS): DEADBAND_SCHEMA},
+        vol.Optional(CONF_HEARTBEAT, default=600): cv.positive_int,
+        vol.Optional(CONF_CELLS, default=4): vol.All(int, vol.Range(min=1, max=4)),
+        vol.Optional(CONF_HISTORY_SIZE, default=0): cv.positive_int,
+        vol.Optional(CONF_EXTERNAL_STATISTICS, default=[]): vol.All(
+            cv.ensure_list, [vol.In(CHANNELS)]
+        ),
+        vol.Optional(CONF_MAX_AGE, default=120): cv.positive_int,
+        vol.Optional(CONF_LATENCY_BUDGET, default=0.5): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+        vol.Optional(CONF_REFRESH, default={}): {
+            vol.In(REFRESH_GROUPS): cv.positive_int
+        },
+        vol.Optional(CONF_CAPTURE, default=False): cv.boolean,
+        vol.Optional(CONF_OPENMETRICS, default=False): cv.boolean,
+        vol.Optional(CONF_EMULATOR): EMULATOR_SCHEMA,
+    }
+)
+
+# One device, or a list of devices on one or more buses
+CONFIG_SCHEMA = vol.Schema(
+    {DOMAIN: vol.All(cv.ensure_list, [DEVICE_SCHEMA], _unique_devices)},
     extra=vol.ALLOW_EXTRA,
 )
 
+EXPORT_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_UNIQUE_ID): cv.string,
+        vol.Required(ATTR_START): cv.datetime,
+        vol.Required(ATTR_END): cv.datetime,
+    }
+)
+DUMP_DIAGNOSTICS_SCHEMA = vol.Schema({vol.Optional(CONF_UNIQUE_ID): cv.string})
+SHUTDOWN_SCHEMA = DUMP_DIAGNOSTICS_SCHEMA
+
 
 async def async_setup(hass: HomeAssistant, global_config: ConfigType) -> bool:
     """Your controller/hub specific code."""
@@ -48,25 +214,111 @@ async def async_setup(hass: HomeAssistant, global_config: ConfigType) -> bool:
     if DOMAIN not in global_config:
         return False
 
-    config: ConfigType = global_config[DOMAIN]
+    # One I2C worker per bus, shared by all devices on it
+    buses: dict[int, UpsHatEBus] = {}
+    coordinators: dict[str, UpsHatECoordinator] = hass.data.setdefault(DOMAIN, {})
+    for config in global_config[DOMAIN]:
+        if CONF_SCAN_INTERVAL not in config:
+            return False
+        config[CONF_SCAN_INTERVAL] = timedelta(seconds=config[CONF_SCAN_INTERVAL])
 
-    if CONF_SCAN_INTERVAL not in config:
-        return False
-    config[CONF_SCAN_INTERVAL] = timedelta(seconds=config[CONF_SCAN_INTERVAL])
+        if (bus := buses.get(config[CONF_BUS])) is None:
+            bus = buses[config[CONF_BUS]] = create_bus(
+                hass,
+                [
+                    device
+                    for device in global_config[DOMAIN]
+                    if device[CONF_BUS] == config[CONF_BUS]
+                ],
+            )
+        coordinators[config[CONF_UNIQUE_ID]] = UpsHatECoordinator(hass, config, bus)
 
-    coordinator = UpsHatECoordinator(hass, config)
-    await coordinator.async_request_refresh()
+    async def _async_close(event: Event) -> None:
+        await asyncio.gather(
+            *(coordinator.async_close() for coordinator in coordinators.values())
+        )
+        await asyncio.gather(*(bus.async_close() for bus in buses.values()))
 
-    await async_load_platform(
-        hass, "sensor", DOMAIN, {"coordinator": coordinator}, config
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_close)
+    await asyncio.gather(
+        *(coordinator.async_restore() for coordinator in coordinators.values())
     )
+    for coordinator in coordinators.values():
+        coordinator.async_start_sampling()
+        coordinator.async_start_power_watch()
 
-    await async_load_platform(
-        hass, "binary_sensor", DOMAIN, {"coordinator": coordinator}, config
+    def _coordinator(call: ServiceCall) -> UpsHatECoordinator:
+        """Return the coordinator of the device a service call targets."""
+        if (unique_id := call.data.get(CONF_UNIQUE_ID)) is None:
+            if len(coordinators) > 1:
+                raise ServiceValidationError(
+                    "unique_id is required with more than one device"
+                )
+            return next(iter(coordinators.values()))
+        if unique_id not in coordinators:
+            raise ServiceValidationError(f"No device with unique_id {unique_id}")
+        return coordinators[unique_id]
+
+    async def _async_export_history(call: ServiceCall) -> ServiceResponse:
+        return await _coordinator(call).async_export_history(
+            call.data[ATTR_START], call.data[ATTR_END]
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXPORT_HISTORY,
+        _async_export_history,
+        schema=EXPORT_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def _async_dump_diagnostics(call: ServiceCall) -> ServiceResponse:
+        return _coordinator(call).diagnostics_dump()
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_DUMP_DIAGNOSTICS,
+        _async_dump_diagnostics,
+        schema=DUMP_DIAGNOSTICS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async def _async_shutdown(call: ServiceCall) -> ServiceResponse:
+        if (result := await _coordinator(call).shutdown()) is None:
+            raise HomeAssistantError(
+                "Not shutting down while on mains power"
+                " or before the power state is known"
+            )
+        return result.as_dict()
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SHUTDOWN,
+        _async_shutdown,
+        schema=SHUTDOWN_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
     )
 
-    await async_load_platform(
-        hass, "button", DOMAIN, {"coordinator": coordinator}, config
+    if exported := [c for c in coordinators.values() if c.openmetrics]:
+        if "http" not in hass.config.components:
+            _LOGGER.error("The metrics endpoint needs the http integration")
+        else:
+            # Imported here; the http integration is only needed for it
+            from .openmetrics import OpenMetricsView
+
+            hass.http.register_view(OpenMetricsView(exported))
+
+    # Entities start from the restored snapshot; never wait on the bus here
+    await asyncio.gather(
+        *(
+            async_load_platform(
+                hass, platform, DOMAIN, {"coordinator": coordinator}, global_config
+            )
+            for coordinator in coordinators.values()
+            for platform in PLATFORMS
+        )
     )
+    for coordinator in coordinators.values():
+        coordinator.async_start_polling()
 
     return True
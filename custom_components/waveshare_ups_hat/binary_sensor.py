@@ -5,13 +5,33 @@ from __future__ import annotations
 from homeassistant.components.binary_sensor import (
     BinarySensorDeviceClass,
     BinarySensorEntity,
+    BinarySensorEntityDescription,
 )
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 
+from .coordinator import UpsHatECoordinator
 from .entity import UpsHatEEntity
 
+BINARY_SENSORS: tuple[BinarySensorEntityDescription, ...] = (
+    BinarySensorEntityDescription(
+        key="online",
+        name="Online",
+        device_class=BinarySensorDeviceClass.PLUG,
+    ),
+    BinarySensorEntityDescription(
+        key="charging",
+        name="Charging",
+        device_class=BinarySensorDeviceClass.BATTERY_CHARGING,
+    ),
+    BinarySensorEntityDescription(
+        key="fast_charging",
+        name="Fast Charging",
+        device_class=BinarySensorDeviceClass.BATTERY_CHARGING,
+    ),
+)
+
 
 async def async_setup_platform(
     hass: HomeAssistant,
@@ -26,55 +46,24 @@ async def async_setup_platform(
 
     coordinator = discovery_info.get("coordinator")
 
-    sensors = [
-        OnlineBinarySensor(coordinator),
-        ChargingBinarySensor(coordinator),
-        FastChargingBinarySensor(coordinator),
-    ]
-
-    async_add_entities(sensors)
-
-
-class OnlineBinarySensor(UpsHatEEntity, BinarySensorEntity):
-    """Online binary sensor."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the online binary sensor."""
-        super().__init__(coordinator)
-        self._name = "Online"
-        self._attr_device_class = BinarySensorDeviceClass.PLUG
-
-    @property
-    def is_on(self):
-        """Return True if the UPS Hat E is connected to power."""
-        return self._coordinator.data["online"]
-
-
-class ChargingBinarySensor(UpsHatEEntity, BinarySensorEntity):
-    """Charging binary sensor."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the charging binary sensor."""
-        super().__init__(coordinator)
-        self._name = "Charging"
-        self._attr_device_class = BinarySensorDeviceClass.BATTERY_CHARGING
-
-    @property
-    def is_on(self):
-        """Return True if the UPS Hat E is charging."""
-        return self._coordinator.data["charging"]
+    async_add_entities(
+        UpsHatEBinarySensor(coordinator, description) for description in BINARY_SENSORS
+    )
 
 
-class FastChargingBinarySensor(UpsHatEEntity, BinarySensorEntity):
-    """Fast charging binary sensor."""
+class UpsHatEBinarySensor(UpsHatEEntity, BinarySensorEntity):
+    """Binary sensor reporting one coordinator flag of the UPS Hat E."""
 
-    def __init__(self, coordinator) -> None:
-        """Initialize the fast charging binary sensor."""
-        super().__init__(coordinator)
-        self._name = "Fast Charging"
-        self._attr_device_class = BinarySensorDeviceClass.BATTERY_CHARGING
+    def __init__(
+        self,
+        coordinator: UpsHatECoordinator,
+        description: BinarySensorEntityDescription,
+    ) -> None:
+        """Initialize the binary sensor."""
+        self.entity_description = description
+        super().__init__(coordinator, description.name, description.key)
 
     @property
     def is_on(self):
-        """Return True if the UPS Hat E is fast charging."""
-        return self._coordinator.data["fast_charging"]
+        """Return True if the flag is set."""
+        return self._value()
@@ -0,0 +1,450 @@
+"""UPS Hat E I2C worker."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import defaultdict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+import errno
+from functools import partial
+import logging
+import threading
+from time import monotonic, perf_counter
+from typing import Any, NamedTuple, TypeVar
+
+import smbus2 as smbus
+from smbus2.smbus2 import I2C_SMBUS_BLOCK_MAX
+
+from homeassistant import core
+from homeassistant.core import callback
+
+from .const import DOMAIN
+from .metrics import BusMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+# Consecutive failed transactions of every device before the handle is
+# closed and reopened
+REOPEN_AFTER = 3
+# Delay before reopening, doubled on every failed reopen (seconds)
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 300.0
+# Time allowed to get a register write confirmed, and the pause between
+# attempts during which queued reads go ahead (seconds)
+COMMAND_TIMEOUT = 2.0
+COMMAND_RETRY_DELAY = 0.1
+
+
+class BusBackoffError(OSError):
+    """The handle is closed and waiting to be reopened."""
+
+
+class CommandResult(NamedTuple):
+    """Outcome of a confirmed register write.
+
+    A write is confirmed by its readback, or without readback by the HAT
+    acknowledging it.
+    """
+
+    register: int
+    value: int
+    confirmed: bool
+    attempts: int
+    # Last value read back, if any, and last error, if any
+    readback: int | None
+    error: Exception | None
+    elapsed: float
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the outcome for a service response."""
+        return {
+            "register": f"{self.register:#04x}",
+            "value": self.value,
+            "confirmed": self.confirmed,
+            "attempts": self.attempts,
+            "readback": self.readback,
+            "error": str(self.error) if self.error else None,
+            "elapsed_ms": round(self.elapsed * 1000, 1),
+        }
+
+
+class UpsHatEBus:
+    """Dedicated I2C worker and arbiter of one I2C bus.
+
+    A single-thread executor owns the SMBus handle and runs every read
+    and write, so a slow or clock-stretched bus never stalls the event loop.
+    All UPS Hat E devices on the bus share it: their transactions are
+    serialized on the one worker, and polls issued in the same event loop
+    iteration run as a single executor job.
+    """
+
+    def __init__(
+        self,
+        hass: core.HomeAssistant,
+        bus_number: int,
+        open_bus: Callable[[int], smbus.SMBus] = smbus.SMBus,
+        probe: int | None = None,
+    ) -> None:
+        """Initialize the I2C worker.
+
+        open_bus opens the handle for a bus number; it defaults to the real
+        SMBus and can be swapped for a compatible backend such as the
+        emulator. probe is a register read once after every open, at the
+        address of the transaction that opens the handle, to confirm the
+        device answers before the handle is used.
+        """
+        self._hass = hass
+        self._bus_number = bus_number
+        self._open_bus = open_bus
+        self._probe = probe
+        self._bus: smbus.SMBus | None = None
+        self._combined = False
+
+        # Recovery from adapter resets: once every device on the bus failed
+        # REOPEN_AFTER times in a row the handle is dropped and transactions
+        # fail fast until _reopen_at, with exponential backoff between
+        # reopen attempts. A single dead device only fails its own reads.
+        self._failures: dict[int, int] = {}
+        self._backoff = BACKOFF_MIN
+        self._reopen_at = 0.0
+        self.reopens = 0
+        # Time base of the backoff; a replay substitutes the capture's
+        self.clock: Callable[[], float] = monotonic
+        self._worker_ident: int | None = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"{DOMAIN}_i2c",
+            initializer=self._init_worker,
+        )
+
+        # Measured time spent on the event loop submitting bus jobs, and on
+        # the worker thread doing the actual bus traffic (seconds).
+        self.loop_time_max = 0.0
+        self.bus_time_last = 0.0
+        self.bus_time_max = 0.0
+        # Per device address: per-register transaction latency and errors
+        self.metrics: defaultdict[int, BusMetrics] = defaultdict(BusMetrics)
+
+        # Jobs queued for the next batch
+        self._batch: list[tuple[Callable[..., Any], tuple, asyncio.Future]] = []
+        # Held for the whole write/readback/retry cycle of one command
+        self._command_lock = asyncio.Lock()
+        self.jobs = 0
+
+    def _init_worker(self) -> None:
+        """Remember the worker thread."""
+        self._worker_ident = threading.get_ident()
+
+    def _handle(self, addr: int) -> smbus.SMBus:
+        """Return the SMBus handle, opening it on first use (worker only).
+
+        addr is the device of the transaction; it answers the probe.
+        """
+        if threading.get_ident() != self._worker_ident:
+            raise RuntimeError("I2C access outside the I2C worker thread")
+        if self._bus is None:
+            _LOGGER.debug("Open SMBus %d", self._bus_number)
+            bus = self._open_bus(self._bus_number)
+            try:
+                if self._probe is not None:
+                    bus.read_i2c_block_data(addr, self._probe, 1)
+            except Exception:
+                bus.close()
+                raise
+            self._bus = bus
+            self._combined = bool(self._bus.funcs & smbus.I2cFunc.I2C)
+            _LOGGER.debug("Combined I2C transactions supported: %s", self._combined)
+        return self._bus
+
+    def _timed(self, func: Callable[..., _T], *args: Any) -> _T:
+        """Run a bus job on the worker and record how long it took."""
+        start = monotonic()
+        try:
+            return func(*args)
+        finally:
+            elapsed = monotonic() - start
+            self.bus_time_last = elapsed
+            self.bus_time_max = max(self.bus_time_max, elapsed)
+
+    async def async_run(self, func: Callable[..., _T], *args: Any) -> _T:
+        """Run func(*args) on the I2C worker and await the result."""
+        start = monotonic()
+        self.jobs += 1
+        future = self._hass.loop.run_in_executor(
+            self._executor, self._timed, func, *args
+        )
+        self.loop_time_max = max(self.loop_time_max, monotonic() - start)
+        return await future
+
+    async def async_run_batched(self, func: Callable[..., _T], *args: Any) -> _T:
+        """Run func(*args) on the I2C worker together with the other devices.
+
+        Every call made in the same event loop iteration goes into one
+        executor job, run back to back; a failing call only fails its caller.
+        """
+        future: asyncio.Future[_T] = self._hass.loop.create_future()
+        self._batch.append((func, args, future))
+        if len(self._batch) == 1:
+            self._hass.loop.call_soon(self._async_flush)
+        return await future
+
+    @callback
+    def _async_flush(self) -> None:
+        """Submit the queued jobs as one executor job."""
+        batch, self._batch = self._batch, []
+        start = monotonic()
+        self.jobs += 1
+        job = self._hass.loop.run_in_executor(
+            self._executor, self._timed, self._run_batch, batch
+        )
+        self.loop_time_max = max(self.loop_time_max, monotonic() - start)
+        job.add_done_callback(partial(self._async_resolve, batch))
+
+    @staticmethod
+    def _async_resolve(batch: list, job: asyncio.Future) -> None:
+        """Hand every caller of a finished batch its own outcome."""
+        if job.cancelled() or job.exception() is not None:
+            error = asyncio.CancelledError() if job.cancelled() else job.exception()
+            outcomes = [(False, error)] * len(batch)
+        else:
+            outcomes = job.result()
+        for (_, _, future), (ok, result) in zip(batch, outcomes):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+    @staticmethod
+    def _run_batch(batch: list) -> list[tuple[bool, Any]]:
+        """Run the jobs of a batch one after the other (worker)."""
+        outcomes = []
+        for func, args, _ in batch:
+            try:
+                outcomes.append((True, func(*args)))
+            except Exception as e:
+                outcomes.append((False, e))
+        return outcomes
+
+    @property
+    def bus_number(self) -> int:
+        """Return the number of the I2C bus."""
+        return self._bus_number
+
+    @property
+    def combined(self) -> bool:
+        """Return True if combined write/read transactions are in use."""
+        return self._combined
+
+    def _transaction(
+        self,
+        addr: int,
+        register: int,
+        length: int,
+        func: Callable[..., _T],
+        *args: Any,
+    ) -> _T:
+        """Run one bus transaction and record its latency and outcome."""
+        if self._bus is None and (wait := self._reopen_at - self.clock()) > 0:
+            raise BusBackoffError(
+                errno.EAGAIN, f"SMBus {self._bus_number} reopens in {wait:.1f} s"
+            )
+        start = perf_counter()
+        ok = False
+        try:
+            result = func(*args)
+            ok = True
+            if self._failures.get(addr, 0) >= REOPEN_AFTER:
+                _LOGGER.info("SMBus %d is back at %#04x", self._bus_number, addr)
+            self._failures[addr] = 0
+            self._backoff = BACKOFF_MIN
+            return result
+        except OSError:
+            self._failed(addr)
+            raise
+        finally:
+            self.metrics[addr].transaction(
+                register, length, (perf_counter() - start) * 1000, ok
+            )
+
+    def _failed(self, addr: int) -> None:
+        """Count a failed transaction; drop the handle when they pile up.
+
+        Only when no device on the bus answers any more is the handle at
+        fault; until then the failing device is left to fail on its own.
+        """
+        self._failures[addr] = self._failures.get(addr, 0) + 1
+        if min(self._failures.values()) < REOPEN_AFTER:
+            return
+        if self._bus is not None:
+            _LOGGER.warning(
+                "SMBus %d failed %d times in a row, reopening it in %.0f s",
+                self._bus_number,
+                self._failures[addr],
+                self._backoff,
+            )
+            self._close()
+            self.reopens += 1
+        else:
+            _LOGGER.debug(
+                "Reopening SMBus %d failed, next try in %.0f s",
+                self._bus_number,
+                self._backoff,
+            )
+        self._reopen_at = self.clock() + self._backoff
+        self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+
+    def read_block(self, addr: int, register: int, length: int) -> list[int]:
+        """Read a register block (worker thread only)."""
+        return self._transaction(
+            addr,
+            register,
+            length,
+            lambda: self._handle(addr).read_i2c_block_data(addr, register, length),
+        )
+
+    def read_burst(self, addr: int, register: int, length: int) -> bytes:
+        """Read a contiguous register window (worker thread only).
+
+        Uses a single combined write/read transaction when the adapter
+        supports it, otherwise as few SMBus block reads as possible.
+        """
+        return self._transaction(
+            addr, register, length, self._read_burst, addr, register, length
+        )
+
+    def _read_burst(self, addr: int, register: int, length: int) -> bytes:
+        bus = self._handle(addr)
+        if self._combined:
+            write = smbus.i2c_msg.write(addr, [register])
+            read = smbus.i2c_msg.read(addr, length)
+            bus.i2c_rdwr(write, read)
+            return bytes(read)
+
+        buf = bytearray()
+        while len(buf) < length:
+            chunk = min(length - len(buf), I2C_SMBUS_BLOCK_MAX)
+            buf += bytes(bus.read_i2c_block_data(addr, register + len(buf), chunk))
+        return bytes(buf)
+
+    def write_byte(self, addr: int, register: int, value: int) -> None:
+        """Write a single register byte (worker thread only)."""
+        self._transaction(
+            addr,
+            register,
+            1,
+            lambda: self._handle(addr).write_i2c_block_data(
+                addr, register, [value & 0xFF]
+            ),
+        )
+
+    def write_readback(self, addr: int, register: int, value: int) -> int:
+        """Write a register byte and read it back (worker thread only)."""
+        self.write_byte(addr, register, value)
+        return self.read_block(addr, register, 1)[0]
+
+    async def async_write_confirmed(
+        self,
+        addr: int,
+        register: int,
+        value: int,
+        timeout: float = COMMAND_TIMEOUT,
+        readback: bool = True,
+        urgent: bool = False,
+    ) -> CommandResult:
+        """Write a register byte until it is confirmed, within timeout.
+
+        With readback, a write is confirmed once reading the register back
+        returns the byte; without it, once the HAT acknowledges the write,
+        so that only bus errors are retried. Use the latter for command
+        registers that do not read back what was written.
+
+        An urgent command, such as the shutdown as Home Assistant stops,
+        does not wait for the backoff: every attempt reopens the handle
+        right away.
+
+        Commands run one at a time. Each attempt is a single job on the
+        worker, queued behind the reads already submitted, so polls keep
+        going between retries.
+        """
+        job = partial(
+            self.write_readback if readback else self.write_byte, addr, register, value
+        )
+        if urgent:
+            job = partial(self._urgent, job)
+        async with self._command_lock:
+            start = monotonic()
+            attempts = 0
+            read = error = None
+            while True:
+                attempts += 1
+                try:
+                    result = await self.async_run(job)
+                    if readback:
+                        read = result
+                    error = None
+                except OSError as e:
+                    error = e
+                confirmed = error is None and (not readback or read == value & 0xFF)
+                if confirmed:
+                    break
+                if monotonic() + COMMAND_RETRY_DELAY >= start + timeout:
+                    break
+                await asyncio.sleep(COMMAND_RETRY_DELAY)
+
+            if not confirmed:
+                _LOGGER.warning(
+                    "Write of %#04x to register %#04x at %#04x not confirmed"
+                    " after %d attempts (read back %s, %s)",
+                    value,
+                    register,
+                    addr,
+                    attempts,
+                    read,
+                    error,
+                )
+            return CommandResult(
+                register,
+                value,
+                confirmed,
+                attempts,
+                read,
+                error,
+                monotonic() - start,
+            )
+
+    def _urgent(self, func: Callable[[], _T]) -> _T:
+        """Run func without waiting for the backoff (worker thread only)."""
+        self._reopen_at = 0.0
+        return func()
+
+    async def async_read_block(
+        self, addr: int, register: int, length: int
+    ) -> list[int]:
+        """Read a register block on the I2C worker."""
+        return await self.async_run(self.read_block, addr, register, length)
+
+    async def async_write_byte(self, addr: int, register: int, value: int) -> None:
+        """Write a single register byte on the I2C worker."""
+        await self.async_run(self.write_byte, addr, register, value)
+
+    def _close(self) -> None:
+        if self._bus is not None:
+            _LOGGER.debug("Close SMBus %d", self._bus_number)
+            try:
+                self._bus.close()
+            except OSError as e:
+                _LOGGER.debug("Closing SMBus %d failed: %s", self._bus_number, e)
+            self._bus = None
+
+    async def async_close(self) -> None:
+        """Close the SMBus handle.
+
+        The worker stays available; a later write (e.g. the shutdown
+        command on Home Assistant close) transparently reopens the handle.
+        """
+        await self.async_run(self._close)
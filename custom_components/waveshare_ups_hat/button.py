@@ -2,12 +2,12 @@
 
 from __future__ import annotations
 
-import asyncio
 import logging
 
 from homeassistant.components.button import ButtonDeviceClass, ButtonEntity
-from homeassistant.const import EntityCategory, EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.const import EntityCategory
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 
@@ -38,24 +38,17 @@ class ShutdownButton(UpsHatEEntity, ButtonEntity):
 
     def __init__(self, hass: HomeAssistant, coordinator: UpsHatECoordinator) -> None:
         """Initialize the ShutdownButton entity."""
-        super().__init__(coordinator)
-        self._name = "Shutdown"
+        super().__init__(coordinator, "Shutdown")
         self._attr_device_class = ButtonDeviceClass.RESTART
         self._attr_entity_category = EntityCategory.CONFIG
-
-        # Add a listener to detect when Home Assisnt is shutting down
-        hass.bus.async_listen(
-            EVENT_HOMEASSISTANT_CLOSE, self._async_shutdown_event_handler
-        )
+        # The shutdown on Home Assistant stop is up to the coordinator's
+        # ShutdownOrchestrator
 
         _LOGGER.debug("ShutdownButton initialized")
 
-    async def _async_shutdown_event_handler(self, call) -> None:
-        _LOGGER.debug("Shutdown event handled: %s (async)", call.data)
-        await asyncio.sleep(15)
-        await self.async_press()
-
     async def async_press(self) -> None:
         """Handle button press to initiate UPS shutdown."""
         _LOGGER.debug("ShutdownButton pressed (async)")
-        await self._coordinator.shutdown()
+        result = await self._coordinator.shutdown()
+        if result is not None and not result.confirmed:
+            raise HomeAssistantError("The UPS did not acknowledge the shutdown command")
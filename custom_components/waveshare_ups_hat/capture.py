@@ -0,0 +1,148 @@
+"""UPS Hat E raw register capture and replay."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from ctypes import memmove
+import errno
+import logging
+import struct
+from typing import BinaryIO
+
+from smbus2 import I2cFunc, i2c_msg
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"UPSC"
+VERSION = 1
+HEADER = struct.Struct("<4sH")
+
+# wall-clock timestamp, first register, length; followed by the raw bytes.
+# A zero length records a failed read.
+RECORD = struct.Struct("<dBB")
+
+
+class CaptureWriter:
+    """Append-only file of timestamped raw register bursts.
+
+    Not thread safe: only use it from the I2C worker.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize the writer."""
+        self.path = path
+        self._file: BinaryIO | None = None
+
+    def open(self) -> None:
+        """Open the file for appending, writing the header if it is new."""
+        self._file = open(self.path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION))
+
+    def write(self, timestamp: float, register: int, data: bytes) -> None:
+        """Append one burst; empty data marks a failed read."""
+        if self._file is not None:
+            self._file.write(RECORD.pack(timestamp, register, len(data)) + data)
+
+    def flush(self) -> None:
+        """Push buffered records to the file."""
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        """Close the file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_capture(path: str) -> Iterator[tuple[float, int, bytes]]:
+    """Yield (timestamp, register, data) for every burst of a capture file."""
+    with open(path, "rb") as file:
+        magic, version = HEADER.unpack(file.read(HEADER.size))
+        if (magic, version) != (MAGIC, VERSION):
+            raise ValueError(f"{path} is not a UPS Hat E capture")
+        while header := file.read(RECORD.size):
+            if len(header) < RECORD.size:
+                _LOGGER.warning("Truncated record at the end of %s", path)
+                return
+            timestamp, register, length = RECORD.unpack(header)
+            yield timestamp, register, file.read(length)
+
+
+class ReplaySMBus:
+    """Stand-in for smbus2.SMBus serving the bursts of a capture, in order.
+
+    Each read returns the next captured burst, which must be of the same
+    register window; a captured failure raises EIO again. clock() is the
+    timestamp of the burst served last, or of the next one once peeked, so
+    time-based processing such as energy integration, the register group
+    refresh schedule, the latency budget and the bus backoff follows the
+    capture rather than the wall clock.
+    """
+
+    funcs = I2cFunc.I2C
+
+    def __init__(self, bus: int, path: str) -> None:
+        """Initialize the replay; bus is ignored."""
+        self._records = read_capture(path)
+        self._now = 0.0
+        self._next: tuple[float, int, bytes] | None = None
+        self._peeked = False
+        # Bursts served or skipped so far
+        self.served = 0
+
+    def clock(self) -> float:
+        """Return the capture time of the peeked or else the last served burst."""
+        if self._peeked and self._next is not None:
+            return self._next[0]
+        return self._now
+
+    def peek(self) -> tuple[float, int, bytes] | None:
+        """Return the next burst without consuming it."""
+        if not self._peeked:
+            self._next = next(self._records, None)
+            self._peeked = True
+        return self._next
+
+    def skip(self) -> None:
+        """Drop the next burst without serving it."""
+        if self.peek() is not None:
+            self.served += 1
+        self._peeked = False
+
+    def _read(self, register: int, length: int) -> bytes:
+        record = self.peek()
+        self._peeked = False
+        if record is None:
+            raise EOFError("End of capture")
+        self.served += 1
+        self._now, captured, data = record
+        if not data:
+            raise OSError(errno.EIO, "Captured I/O error")
+        if captured != register or len(data) != length:
+            raise ValueError(
+                f"Capture holds {len(data)} bytes at {captured:#x},"
+                f" not {length} at {register:#x}"
+            )
+        return data
+
+    def read_i2c_block_data(
+        self, i2c_addr: int, register: int, length: int
+    ) -> list[int]:
+        """Read the next captured burst."""
+        return list(self._read(register, length))
+
+    def write_i2c_block_data(
+        self, i2c_addr: int, register: int, data: list[int]
+    ) -> None:
+        """Ignore writes; the capture is read only."""
+
+    def i2c_rdwr(self, *messages: i2c_msg) -> None:
+        """Serve the next captured burst to a combined write/read."""
+        write, read = messages
+        data = self._read(bytes(write)[0], read.len)
+        memmove(read.buf, data, len(data))
+
+    def close(self) -> None:
+        """Close the replay."""
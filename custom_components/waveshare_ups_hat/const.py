@@ -1,15 +1,64 @@
 """Constants."""
 
+from typing import NamedTuple
+
+from homeassistant.components.sensor import SensorDeviceClass
+from homeassistant.const import (
+    PERCENTAGE,
+    UnitOfElectricCurrent,
+    UnitOfElectricPotential,
+    UnitOfPower,
+    UnitOfTime,
+)
+
 DOMAIN = "waveshare_ups_hat"
 DEFAULT_ADDR = "0x2d"
 DEFAULT_UNIQUE_ID = "ups_hat_e"
 DEFAULT_NAME = "UPS HAT E"
+DEFAULT_BUS = 1
 
 CONF_ADDR = "addr"
+CONF_BUS = "bus"
 CONF_SCAN_INTERVAL = "scan_interval"
+CONF_ADAPTIVE_INTERVAL = "adaptive_interval"
+CONF_VOLTAGE_RATE = "voltage_rate"
+CONF_CURRENT_RATE = "current_rate"
+CONF_OVERSAMPLING_RATE = "oversampling_rate"
+CONF_DEADBAND = "deadband"
+CONF_ABSOLUTE = "absolute"
+CONF_RELATIVE = "relative"
+CONF_HEARTBEAT = "heartbeat"
+CONF_CELLS = "cells"
+CONF_HISTORY_SIZE = "history_size"
+CONF_POWER_WATCH_INTERVAL = "power_watch_interval"
+CONF_EXTERNAL_STATISTICS = "external_statistics"
+CONF_CAPTURE = "capture"
+CONF_MAX_AGE = "max_age"
+CONF_LATENCY_BUDGET = "latency_budget"
+CONF_REFRESH = "refresh"
+CONF_OPENMETRICS = "openmetrics"
+CONF_EMULATOR = "emulator"
+CONF_SCENARIO = "scenario"
+CONF_SPEED = "speed"
+CONF_LATENCY = "latency"
+CONF_ERROR_RATE = "error_rate"
+
+SERVICE_EXPORT_HISTORY = "export_history"
+SERVICE_DUMP_DIAGNOSTICS = "dump_diagnostics"
+SERVICE_SHUTDOWN = "shutdown"
+ATTR_START = "start"
+ATTR_END = "end"
+
+EVENT_POWER_LOST = f"{DOMAIN}_power_lost"
+EVENT_POWER_RESTORED = f"{DOMAIN}_power_restored"
 
 SAMPLES = 3
 
+STORAGE_VERSION = 1
+
+# Accumulated energy counters, in Wh
+ENERGY_KEYS = ("energy_charged", "energy_discharged", "energy_input")
+
 # Registers
 # https://www.waveshare.com/wiki/UPS_HAT_(E)_Register
 
@@ -60,12 +109,165 @@ REG_REM_BAT_CAP = 0x26
 # Battery Remaining Discharge Time Register
 REG_REM_BAT_TIME = 0x28
 
+# Battery Remaining Charge Time Register
+REG_REM_CHARGE_TIME = 0x2A
+
 # Cell 1 Voltage Register
 REG_CELL_1_VOLTAGE = 0x30
 
+# Burst read window covering all registers above (0x02 - 0x37)
+REG_BURST_START = REG_CHARGING
+BURST_LENGTH = 0x38 - REG_BURST_START
+
 # Value to write when triger shutdown
 CONST_SHUTDOWN_CMD = 0x55
 
+
+class RegisterField(NamedTuple):
+    """One field of the register map."""
+
+    key: str
+    address: int
+    # struct format character, e.g. "B" (u8), "h" (s16) or "H" (u16)
+    fmt: str
+    # Divisor from the raw register value to the published unit
+    scale: int
+    # Decimal places of the published value
+    precision: int
+    unit: str | None
+    # Kept in the ring buffer: filtered, aggregated and exported per sample
+    buffered: bool = False
+    # Sensor name, also the unique_id suffix, device class and display
+    # precision; a field without a name gets no sensor
+    name: str | None = None
+    device_class: SensorDeviceClass | None = None
+    display_precision: int | None = None
+    # Cell measured; the field only exists with at least that many cells
+    cell: int | None = None
+
+
+def _cell(number: int, address: int) -> RegisterField:
+    return RegisterField(
+        f"cell{number}_voltage",
+        address,
+        "h",
+        1000,
+        3,
+        UnitOfElectricPotential.VOLT,
+        buffered=True,
+        name=f"Cell{number} Voltage",
+        device_class=SensorDeviceClass.VOLTAGE,
+        display_precision=1,
+        cell=number,
+    )
+
+
+# Register map, in address order. Everything below is decoded from it, and
+# the buffered channels, register sensors and their metrics derive from it.
+REGISTERS = (
+    RegisterField("status", REG_CHARGING, "B", 1, 0, None),
+    RegisterField(
+        "charger_voltage",
+        REG_BUSVOLTAGE,
+        "h",
+        1000,
+        2,
+        UnitOfElectricPotential.VOLT,
+        buffered=True,
+        name="Charger Voltage",
+        device_class=SensorDeviceClass.VOLTAGE,
+        display_precision=1,
+    ),
+    RegisterField(
+        "charger_current",
+        0x12,
+        "h",
+        1,
+        2,
+        UnitOfElectricCurrent.MILLIAMPERE,
+        buffered=True,
+        name="Charger Current",
+        device_class=SensorDeviceClass.CURRENT,
+        display_precision=0,
+    ),
+    RegisterField(
+        "charger_power",
+        REG_POWER,
+        "h",
+        1000,
+        2,
+        UnitOfPower.WATT,
+        buffered=True,
+        name="Charger Power",
+        device_class=SensorDeviceClass.POWER,
+        display_precision=1,
+    ),
+    RegisterField(
+        "battery_voltage",
+        REG_BATVOLTAGE,
+        "h",
+        1000,
+        2,
+        UnitOfElectricPotential.VOLT,
+        buffered=True,
+        name="Battery Voltage",
+        device_class=SensorDeviceClass.VOLTAGE,
+        display_precision=1,
+    ),
+    RegisterField(
+        "battery_current",
+        REG_CURRENT,
+        "h",
+        1,
+        2,
+        UnitOfElectricCurrent.MILLIAMPERE,
+        buffered=True,
+        name="Battery Current",
+        device_class=SensorDeviceClass.CURRENT,
+        display_precision=0,
+    ),
+    RegisterField(
+        "soc",
+        REG_BATSOC,
+        "h",
+        1,
+        1,
+        PERCENTAGE,
+        name="SoC",
+        device_class=SensorDeviceClass.BATTERY,
+        display_precision=1,
+    ),
+    RegisterField("remaining_capacity", REG_REM_BAT_CAP, "h", 1, 0, "mAh"),
+    RegisterField("time_to_empty", REG_REM_BAT_TIME, "h", 1, 0, UnitOfTime.MINUTES),
+    RegisterField("time_to_full", REG_REM_CHARGE_TIME, "h", 1, 0, UnitOfTime.MINUTES),
+    _cell(1, REG_CELL_1_VOLTAGE),
+    _cell(2, 0x32),
+    _cell(3, 0x34),
+    _cell(4, 0x36),
+)
+
+
+class RegisterGroup(NamedTuple):
+    """Register window with its own refresh period.
+
+    Also the unit read on its own when a burst read fails.
+    """
+
+    name: str
+    start: int
+    length: int
+
+
+REGISTER_GROUPS = (
+    RegisterGroup("status", REG_CHARGING, 1),
+    RegisterGroup("charger", REG_BUSVOLTAGE, REG_POWER + 2 - REG_BUSVOLTAGE),
+    RegisterGroup("battery", REG_BATVOLTAGE, REG_REM_BAT_CAP - REG_BATVOLTAGE),
+    RegisterGroup(
+        "capacity", REG_REM_BAT_CAP, REG_REM_CHARGE_TIME + 2 - REG_REM_BAT_CAP
+    ),
+    RegisterGroup("cells", REG_CELL_1_VOLTAGE, 8),
+)
+
 ATTR_CAPACITY = "capacity"
 ATTR_SOC = "soc"
 ATTR_PSU_VOLTAGE = "psu_voltage"
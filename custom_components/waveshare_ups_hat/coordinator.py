@@ -1,31 +1,270 @@
 """UPS Hat E coordinator."""
 
+import asyncio
+import csv
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import combinations
 import logging
-from collections import deque
-from statistics import median
-
-import smbus2 as smbus
+import struct
+from math import inf
+from typing import Any
+from time import monotonic, perf_counter, time
 
 from homeassistant import core
-from homeassistant.const import CONF_NAME, CONF_UNIQUE_ID
+from homeassistant.const import (
+    CONF_MAXIMUM,
+    CONF_MINIMUM,
+    CONF_NAME,
+    CONF_UNIQUE_ID,
+    UnitOfTime,
+)
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.typing import ConfigType
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 
+from .bus import BusBackoffError, CommandResult, UpsHatEBus
 from .const import (
+    CONF_ABSOLUTE,
+    CONF_ADAPTIVE_INTERVAL,
     CONF_ADDR,
+    CONF_BUS,
+    CONF_CAPTURE,
+    CONF_CELLS,
+    CONF_CURRENT_RATE,
+    CONF_DEADBAND,
+    CONF_EMULATOR,
+    CONF_EXTERNAL_STATISTICS,
+    CONF_HEARTBEAT,
+    CONF_HISTORY_SIZE,
+    CONF_LATENCY_BUDGET,
+    CONF_MAX_AGE,
+    CONF_OPENMETRICS,
+    CONF_OVERSAMPLING_RATE,
+    CONF_POWER_WATCH_INTERVAL,
+    CONF_REFRESH,
+    CONF_RELATIVE,
     CONF_SCAN_INTERVAL,
+    CONF_VOLTAGE_RATE,
+    DEFAULT_BUS,
+    REG_CHARGING,
     DOMAIN,
-    REG_BATVOLTAGE,
+    ENERGY_KEYS,
+    EVENT_POWER_LOST,
+    EVENT_POWER_RESTORED,
+    REG_BURST_START,
     REG_BUSVOLTAGE,
-    REG_CELL_1_VOLTAGE,
-    REG_CHARGING,
+    REG_CURRENT,
     REG_REBOOT,
+    REGISTER_GROUPS,
+    REGISTERS,
     CONST_SHUTDOWN_CMD,
     SAMPLES,
+    STORAGE_VERSION,
+    RegisterField,
+    RegisterGroup,
 )
+from .capture import CaptureWriter
+from .emulator import EmulatedBus
+from .history import KIND_POLL, KIND_SAMPLE, History, HistorySnapshot
+from .longterm import LongTermStatistics
+from .metrics import BusMetrics, Histogram
+from .predictor import DischargeModel
+from .ringbuffer import RingBuffer, WindowStats
+from .shutdown import ShutdownOrchestrator
 
 _LOGGER = logging.getLogger(__name__)
 
+# Register window sampled by the oversampling engine (VBUS + battery V/I)
+FAST_START = REG_BUSVOLTAGE
+FAST_LENGTH = REG_CURRENT + 2 - REG_BUSVOLTAGE
+
+# Buffered channels, one ring buffer column each: the buffered registers
+# and the remaining time, derived from the time to empty or to full
+CHANNELS = (
+    *(field.key for field in REGISTERS if field.buffered),
+    "remaining_time",
+)
+
+
+def _compile(fields: tuple[RegisterField, ...], start: int, length: int):
+    """Build one little-endian struct for a register window, padding gaps."""
+    fmt = "<"
+    pos = start
+    for field in fields:
+        fmt += f"{field.address - pos}x" if field.address > pos else ""
+        fmt += field.fmt
+        pos = field.address + struct.calcsize("<" + field.fmt)
+    fmt += f"{start + length - pos}x" if start + length > pos else ""
+    return struct.Struct(fmt)
+
+
+def _columns(fields: tuple[RegisterField, ...]) -> tuple[tuple[int, int], ...]:
+    """Return (buffer column, field index) pairs for the buffered fields."""
+    return tuple(
+        (CHANNELS.index(field.key), index)
+        for index, field in enumerate(fields)
+        if field.key in CHANNELS
+    )
+
+
+BURST_COLUMNS = _columns(REGISTERS)
+FAST_FIELDS = tuple(
+    field
+    for field in REGISTERS
+    if FAST_START <= field.address < FAST_START + FAST_LENGTH
+)
+FAST_STRUCT = _compile(FAST_FIELDS, FAST_START, FAST_LENGTH)
+FAST_COLUMNS = _columns(FAST_FIELDS)
+# Column and key of the channels refreshed by the oversampling engine
+FAST_CHANNELS = tuple((column, CHANNELS[column]) for column, _ in FAST_COLUMNS)
+# Position of each oversampled field among all register values
+FAST_INDEX = tuple(REGISTERS.index(field) for field in FAST_FIELDS)
+
+
+def _group(group: RegisterGroup):
+    """Return a group with the REGISTERS indices of its fields and its decoder."""
+    indices = tuple(
+        index
+        for index, field in enumerate(REGISTERS)
+        if group.start <= field.address < group.start + group.length
+    )
+    fields = tuple(REGISTERS[index] for index in indices)
+    return group, indices, _compile(fields, group.start, group.length)
+
+
+GROUPS = tuple(_group(group) for group in REGISTER_GROUPS)
+GROUP_NAMES = tuple(group.name for group in REGISTER_GROUPS)
+# Groups with a configurable refresh period; the status register, first in
+# every read window, is read on every poll
+REFRESH_GROUPS = GROUP_NAMES[1:]
+
+
+def _window(first: int, last: int):
+    """Return the read window spanning groups first to last and its decoder.
+
+    The holes between the groups are read too, see _reads.
+    """
+    start = REGISTER_GROUPS[first].start
+    end = REGISTER_GROUPS[last].start + REGISTER_GROUPS[last].length
+    indices = tuple(
+        index for index, field in enumerate(REGISTERS) if start <= field.address < end
+    )
+    fields = tuple(REGISTERS[index] for index in indices)
+    names = GROUP_NAMES[first : last + 1]
+    return start, end - start, indices, _compile(fields, start, end - start), names
+
+
+# Every contiguous run of groups; (0, last) is the full burst window
+WINDOWS = {
+    (first, last): _window(first, last)
+    for first in range(len(REGISTER_GROUPS))
+    for last in range(first, len(REGISTER_GROUPS))
+}
+
+# Bytes of groups skipped between two due groups above which the two are
+# read as separate transactions. Another transaction puts the device
+# address, the register and the repeated-start address on the bus, about
+# 31 bit times, plus an ioctl round trip, so it pays off for longer gaps.
+SPLIT_GAP = 4
+
+
+def _reads(due: tuple[int, ...]):
+    """Return the read windows of the due groups, one per transaction.
+
+    Neighbouring groups are always read together, as in the full burst
+    window. A group that is not due is only read along when the gap it
+    leaves is at most SPLIT_GAP bytes.
+    """
+    runs = [[due[0], due[0]]]
+    for index in due[1:]:
+        last = REGISTER_GROUPS[runs[-1][1]]
+        gap = REGISTER_GROUPS[index].start - last.start - last.length
+        if index > runs[-1][1] + 1 and gap > SPLIT_GAP:
+            runs.append([index, index])
+        else:
+            runs[-1][1] = index
+    return tuple(WINDOWS[first, last] for first, last in runs)
+
+
+# Read windows of every combination of due groups
+READS = {
+    due: _reads(due)
+    for count in range(1, len(REGISTER_GROUPS) + 1)
+    for due in combinations(range(len(REGISTER_GROUPS)), count)
+}
+# Seconds a group may come due early, so that a refresh period that is a
+# multiple of the scan interval is not pushed back by one poll of jitter
+REFRESH_SLACK = 1
+# Extra attempts per group when reading group by group
+GROUP_RETRIES = 2
+
+# Numeric data keys of the sensors, the keys a deadband may be set for
+DATA_KEYS = (
+    *CHANNELS,
+    "soc",
+    "remaining_battery_capacity",
+    "predicted_time_to_empty",
+    *ENERGY_KEYS,
+)
+
+# Power watch reads that must agree before a VBUS edge is published
+POWER_DEBOUNCE = 2
+
+# Index of each register field in a decoded burst
+FIELD = {field.key: index for index, field in enumerate(REGISTERS)}
+REMAINING_TIME = CHANNELS.index("remaining_time")
+CHARGER_POWER = CHANNELS.index("charger_power")
+BATTERY_VOLTAGE = CHANNELS.index("battery_voltage")
+BATTERY_CURRENT = CHANNELS.index("battery_current")
+
+# Seconds to coalesce energy counter, discharge curve and snapshot writes
+# to storage
+ENERGY_SAVE_DELAY = 300
+MODEL_SAVE_DELAY = 600
+SNAPSHOT_SAVE_DELAY = 60
+
+# Divisor and decimal places from the raw register value to the published one
+SCALE = {field.key: field.scale for field in REGISTERS}
+PRECISION = {field.key: field.precision for field in REGISTERS}
+UNITS = {field.key: field.unit for field in REGISTERS}
+UNITS["remaining_time"] = UnitOfTime.MINUTES
+
+
+def _export_history(
+    path: str, snapshot: HistorySnapshot, start: float, end: float
+) -> int:
+    """Write the history between start and end to a CSV file (executor)."""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["time", "kind", *(field.key for field in REGISTERS)])
+        for timestamp, kind, *values in snapshot.records(start, end):
+            stamp = dt_util.utc_from_timestamp(timestamp).isoformat()
+            writer.writerow([stamp, kind, *values])
+            count += 1
+    return count
+
+
+def create_bus(hass: core.HomeAssistant, configs: list[ConfigType]) -> UpsHatEBus:
+    """Create the I2C worker of a bus from the configs of its devices."""
+    _LOGGER.debug("Assign I2C worker")
+    bus_number = configs[0].get(CONF_BUS, DEFAULT_BUS)
+    if configs[0].get(CONF_EMULATOR) is not None:
+        # Every device on the bus is emulated, see _unique_devices
+        devices = {
+            int(config[CONF_ADDR], 0): config[CONF_EMULATOR] for config in configs
+        }
+        _LOGGER.warning("Using the emulated UPS Hat E: %s", devices)
+        return UpsHatEBus(
+            hass, bus_number, partial(EmulatedBus, devices=devices), REG_CHARGING
+        )
+    # The status register doubles as a cheap probe after (re)opening
+    return UpsHatEBus(hass, bus_number, probe=REG_CHARGING)
+
 
 class UpsHatECoordinator(DataUpdateCoordinator):
     """Coordinator for UPS Hat E integration.
@@ -34,158 +273,789 @@ class UpsHatECoordinator(DataUpdateCoordinator):
     manages state buffers, and provides methods for device control.
     """
 
-    def __init__(self, hass: core.HomeAssistant, config: ConfigType) -> None:
+    def __init__(
+        self, hass: core.HomeAssistant, config: ConfigType, bus: UpsHatEBus
+    ) -> None:
         """Initialize coordinator."""
         _LOGGER.debug("Initialize coordinator")
         self.name_prefix = config.get(CONF_NAME)
         self.id_prefix = config.get(CONF_UNIQUE_ID)
+        # Number of battery cells in use; unused cells get no sensor
+        self.cells = config.get(CONF_CELLS, 4)
         try:
-            self._addr = int(config.get(CONF_ADDR))
+            self._addr = int(config.get(CONF_ADDR), 0)
         except:
-            _LOGGER.error(f"ADDR {config.get(CONF_ADDR)} for UPS Hat E is invalid.")
+            _LOGGER.error("ADDR %s for UPS Hat E is invalid.", config.get(CONF_ADDR))
             raise
 
-        self.data = {
-            "charger_voltage": 0,
-            "charger_current": 0,
-            "charger_power": 0,
-            "battery_voltage": 0,
-            "battery_current": 0,
-            "soc": 0,
-            "remaining_battery_capacity": 0,  # in Wh
-            "remaining_time": 0,
-            "cell1_voltage": 0,
-            "cell2_voltage": 0,
-            "cell3_voltage": 0,
-            "cell4_voltage": 0,
-            "online": False,
-            "charging": False,
-            "fast_charging": False,
+        # Served by the metrics endpoint, see openmetrics.py
+        self.openmetrics = config.get(CONF_OPENMETRICS, False)
+
+        # Per-key (absolute, relative %) deadbands and the maximum time an
+        # entity holds back a sub-deadband change, applied by the entities.
+        self.deadbands = {
+            key: (band[CONF_ABSOLUTE], band[CONF_RELATIVE])
+            for key, band in config.get(CONF_DEADBAND, {}).items()
         }
+        self.heartbeat = config.get(CONF_HEARTBEAT, 0)
 
         self._is_online = False
         self._is_charging = False
         self._is_fast_charging = False
-        self._charger_current_buf = deque(maxlen=SAMPLES)
-        self._charger_voltage_buf = deque(maxlen=SAMPLES)
-        self._charger_power_buf = deque(maxlen=SAMPLES)
-        self._battery_current_buf = deque(maxlen=SAMPLES)
-        self._battery_voltage_buf = deque(maxlen=SAMPLES)
-        self._remaining_time_buf = deque(maxlen=SAMPLES)
+        # Power events only fire once the VBUS state has been read once
+        self._power_known = False
+
+        # The power watcher reads the status register between polls and
+        # pushes debounced VBUS edges right away
+        self._watch_interval = config.get(CONF_POWER_WATCH_INTERVAL, 0)
+        self._watch_task: asyncio.Task | None = None
+
+        # With an adaptive interval, polls run every min seconds on battery,
+        # while charging or while V/I move faster than the rate thresholds,
+        # and back off by doubling up to max seconds otherwise.
+        interval = config.get(CONF_SCAN_INTERVAL)
+        self._adaptive = config.get(CONF_ADAPTIVE_INTERVAL)
+        self._adapted_from: tuple[float, float, float] | None = None
+        if self._adaptive is not None:
+            interval = timedelta(seconds=self._adaptive[CONF_MAXIMUM])
+
+        # With oversampling the fast channels are sampled between polls and
+        # the buffers hold one scan interval worth of samples.
+        rate = config.get(CONF_OVERSAMPLING_RATE) or 0
+        self._sample_interval = 1 / rate if rate else None
+        window = max(SAMPLES, round(rate * interval.total_seconds()))
+        self._sample_task: asyncio.Task | None = None
+        # Extra state attributes per data key (window statistics, bounds)
+        self.attributes: dict[str, dict[str, float]] = {}
+
+        # Only touched on the I2C worker; the oversampling engine refreshes
+        # the fast channels and carries the slow ones over from the last poll.
+        self._row = [0] * len(CHANNELS)
+        self._buffer = RingBuffer(len(CHANNELS), window)
+        # Statistics of the window published by the last update (loop)
+        self._window: WindowStats | None = None
+
+        # Energy counters in Wh (charged, discharged, input), integrated on
+        # the I2C worker from every buffered row. An interval longer than
+        # two scan intervals (e.g. a bus outage) is skipped, not integrated.
+        self._energy = [0.0] * len(ENERGY_KEYS)
+        self._integrated_at: float | None = None
+        self._max_gap = 2 * interval.total_seconds()
+        self._energy_store = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{self.id_prefix}.energy"
+        )
+
+        # Latest raw value of every register, logged to the on-disk history
+        self._registers = [0] * len(REGISTERS)
+        # When each register group was last read (on _clock). A group is
+        # only read again once its refresh period has passed and is served
+        # from _registers in between. On a failed read a group younger than
+        # max_age is served from _registers as well. Retries stop once a
+        # poll has used up its latency budget.
+        self._read_at: dict[str, float] = {}
+        self._refresh = config.get(CONF_REFRESH, {})
+        self._stale: list[str] = []
+        self._max_age = config.get(CONF_MAX_AGE, 120)
+        self._latency_budget = config.get(CONF_LATENCY_BUDGET, 0.5)
+        self._history: History | None = None
+        if history_size := config.get(CONF_HISTORY_SIZE):
+            self._history = History(
+                hass.config.path(f"{DOMAIN}.{self.id_prefix}.history"),
+                "".join(field.fmt for field in REGISTERS),
+                history_size,
+            )
+
+        # Raw bursts captured for replay, see capture.py
+        self._capture: CaptureWriter | None = None
+        if config.get(CONF_CAPTURE):
+            self._capture = CaptureWriter(
+                hass.config.path(f"{DOMAIN}.{self.id_prefix}.capture")
+            )
+        # Time base of the energy integration, the register refresh schedule
+        # and the latency budget; a replay substitutes the capture's
+        self._clock = monotonic
 
-        _LOGGER.debug("Assign SMBUS")
-        self._bus = smbus.SMBus(1)
+        # Discharge curve learned from outages, for the time to empty
+        self._model = DischargeModel()
+        self._model_store = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{self.id_prefix}.discharge_curve"
+        )
+
+        # Channels aggregated into hourly long-term statistics; these get
+        # no entity, so they stay out of the state history
+        self.external_statistics = config.get(CONF_EXTERNAL_STATISTICS, [])
+        self._statistics: LongTermStatistics | None = None
+        if self.external_statistics:
+            self._statistics = LongTermStatistics(
+                hass,
+                self.id_prefix,
+                self.name_prefix,
+                {
+                    key: (
+                        CHANNELS.index(key),
+                        SCALE.get(key, 1),
+                        PRECISION.get(key, 0),
+                        UNITS[key],
+                    )
+                    for key in self.external_statistics
+                },
+            )
+
+        # Last published data, restored at startup until the first poll
+        self._snapshot_store = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{self.id_prefix}.snapshot"
+        )
+
+        # Snapshot the listeners were last notified with, to diff against
+        self._notified_data: dict | None = None
+        self._notified_stats: dict[str, dict[str, float]] = {}
+        self._notified_success = True
+
+        # Values of the diagnostic entities, refreshed on every update, and
+        # the state writes counted by the entities during one notification
+        self.diagnostics: dict[str, Any] = {}
+        self.state_writes = 0
+
+        # Sends the shutdown command when Home Assistant stops for good
+        self._orchestrator = ShutdownOrchestrator(
+            hass, self.id_prefix, self.shutdown, self.runtime_left
+        )
+
+        # Shared with the other devices on the same bus; see create_bus
+        self._bus = bus
+        self._metrics = bus.metrics[self._addr]
 
         _LOGGER.debug("Call super")
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
-            update_interval=config.get(CONF_SCAN_INTERVAL),
+            # Polled by _async_poll on the interval grid rather than on the
+            # coordinator's own randomly staggered schedule
+            update_interval=None,
+            # async_update_listeners diffs every snapshot, including window
+            # stats that a plain data comparison would miss
             always_update=True,
         )
+        self._interval: timedelta = (
+            timedelta(seconds=self._adaptive[CONF_MINIMUM])
+            if self._adaptive is not None
+            else config.get(CONF_SCAN_INTERVAL)
+        )
+        self._poll_task: asyncio.Task | None = None
+        # Empty until restored from the snapshot or polled
+        self.data: dict[str, Any] = {}
 
-    async def _async_update_data(self):
+    def _buffer_row(
+        self, values: tuple[int, ...], columns: tuple[tuple[int, int], ...]
+    ) -> None:
+        """Copy decoded register values into the current row and buffer it."""
+        row = self._row
+        for column, index in columns:
+            row[column] = values[index]
+        self._buffer.append(row)
+
+        now = self._clock()
+        if (
+            self._integrated_at is not None
+            and now - self._integrated_at <= self._max_gap
+        ):
+            hours = (now - self._integrated_at) / 3600
+            battery_power = row[BATTERY_VOLTAGE] * row[BATTERY_CURRENT] / 1e6
+            energy = self._energy
+            if battery_power > 0:
+                energy[0] += battery_power * hours
+            else:
+                energy[1] -= battery_power * hours
+            energy[2] += row[CHARGER_POWER] / 1000 * hours
+        self._integrated_at = now
+
+    def _read(self, register: int, length: int) -> bytes:
+        """Burst read a register window, capturing it if enabled (worker)."""
         try:
-            try:
-                data = self._bus.read_i2c_block_data(self._addr, REG_CHARGING, 0x01)
-            except Exception as e:
-                _LOGGER.warning(f"PIHAT Exception: {str(e)}")
+            burst = self._bus.read_burst(self._addr, register, length)
+        except BusBackoffError:
+            # Nothing went out on the bus, so there is nothing to capture;
+            # a replay backs off by itself, on the capture's clock
+            raise
+        except Exception:
+            if self._capture is not None:
+                self._capture.write(time(), register, b"")
+            raise
+        if self._capture is not None:
+            self._capture.write(time(), register, burst)
+        return burst
 
-            self._is_online = bool(data[0] & 0x20)
-            self._is_fast_charging = bool(data[0] & 0x40)
-            self._is_charging = bool(data[0] & 0x80)
+    def _poll(
+        self,
+    ) -> tuple[tuple[int, ...], WindowStats, WindowStats, tuple[float, ...]]:
+        """Read and decode the due register groups, aggregate the buffer (worker).
 
-            data = self._bus.read_i2c_block_data(self._addr, REG_BUSVOLTAGE, 0x06)
-            charger_voltage = int.from_bytes(data[0:2], "little", signed=True)
+        Returns the register values, fresh and cached, in REGISTERS order,
+        the window statistics of all buffered channels, the statistics of
+        the rows buffered since the last poll and the energy counters.
+        """
+        now = self._clock()
+        due = tuple(
+            index
+            for index, group in enumerate(REGISTER_GROUPS)
+            if now - self._read_at.get(group.name, -inf)
+            >= self._refresh.get(group.name, 0) - REFRESH_SLACK
+        )
+        reads = READS[due]
+        # The budget covers the failed burst reads as well as the fallback
+        deadline = now + self._latency_budget
+        try:
+            bursts = [self._read(start, length) for start, length, *_ in reads]
+        except Exception as e:
+            _LOGGER.debug("Burst read failed, reading register groups: %s", e)
+            self._poll_groups(due, deadline)
+            started = perf_counter()
+        else:
+            started = perf_counter()
+            registers = self._registers
+            for burst, (_, _, indices, decoder, names) in zip(bursts, reads):
+                for index, value in zip(indices, decoder.unpack_from(burst)):
+                    registers[index] = value
+                for name in names:
+                    self._read_at[name] = now
+            self._stale = []
+        values = tuple(self._registers)
+        if self._history is not None:
+            self._history.append(time(), KIND_POLL, values)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Registers %s", dict(zip(FIELD, values)))
 
-            self._charger_voltage_buf.append(charger_voltage)
+        if not values[FIELD["status"]] & 0x20:
+            # If there is no power use the time to empty
+            remaining_time = values[FIELD["time_to_empty"]]
+        elif values[FIELD["battery_current"]] > 0:
+            # ... when charging the time to full
+            remaining_time = values[FIELD["time_to_full"]]
+        else:
+            # Avoid intrepeting 0xFFFF as a number
+            remaining_time = 0
 
-            charger_current = int.from_bytes(data[2:4], "little", signed=True)
-            self._charger_current_buf.append(charger_current)
+        # Simplistic solution where both types of values go to the same channel
+        self._row[REMAINING_TIME] = remaining_time
+        self._buffer_row(values, BURST_COLUMNS)
 
-            charger_power = int.from_bytes(data[4:6], "little", signed=True)
-            self._charger_power_buf.append(charger_power)
+        stats = added = self._buffer.stats()
+        if self._sample_interval:
+            # Each published aggregate covers its own scan interval
+            self._buffer.clear()
+        else:
+            # The median window overlaps the last polls; only this poll is new
+            row = list(self._row)
+            added = WindowStats(1, row, row, row, [row])
+        self._metrics.decode.observe((perf_counter() - started) * 1000)
+        if self._capture is not None:
+            self._capture.flush()
+        return values, stats, added, tuple(self._energy)
 
-            _LOGGER.debug("VBUS Voltage %5dmV", charger_voltage)
-            _LOGGER.debug("VBUS Current %5dmA", charger_current)
-            _LOGGER.debug("VBUS Power   %5dmW", charger_power)
+    def _poll_groups(self, due: tuple[int, ...], deadline: float) -> None:
+        """Read the due register groups one by one, within the budget (worker).
 
-            data = self._bus.read_i2c_block_data(self._addr, REG_BATVOLTAGE, 0x0C)
-            battery_voltage = int.from_bytes(data[0:2], "little", signed=True)
-            self._battery_voltage_buf.append(int(battery_voltage))
-            _LOGGER.debug("Battery Voltage %d mV", battery_voltage)
+        A group that cannot be read keeps its last values if they are not
+        older than max_age; otherwise the poll fails with the read error.
+        """
+        registers = self._registers
+        self._stale = []
+        for group, indices, decoder in (GROUPS[index] for index in due):
+            decoded = error = None
+            for attempt in range(GROUP_RETRIES + 1):
+                if self._clock() >= deadline:
+                    break
+                if attempt:
+                    self._metrics.retries[group.start] += 1
+                try:
+                    decoded = decoder.unpack_from(self._read(group.start, group.length))
+                    break
+                except Exception as e:
+                    error = e
 
-            battery_current = int.from_bytes(data[2:4], "little", signed=True)
-            self._battery_current_buf.append(int(battery_current))
-            _LOGGER.debug("Battery Current1 %d mA", battery_current)
+            if decoded is not None:
+                for index, value in zip(indices, decoded):
+                    registers[index] = value
+                self._read_at[group.name] = self._clock()
+                continue
 
-            soc = int.from_bytes(data[4:6], "little", signed=True)
-            _LOGGER.debug("Battery Percent %d%%", soc)
+            age = self._clock() - self._read_at.get(group.name, -inf)
+            if age > self._max_age:
+                raise error or TimeoutError(f"No time left to read {group.name}")
+            _LOGGER.debug("Keeping %s registers from %.0f s ago", group.name, age)
+            self._stale.append(group.name)
 
-            remaining_battery_capacity = int.from_bytes(
-                data[6:8], "little", signed=True
+    def _sample(self) -> None:
+        """Take one oversampling reading of the fast channels (worker)."""
+        try:
+            burst = self._read(FAST_START, FAST_LENGTH)
+        except Exception as e:
+            _LOGGER.debug("Oversampling read failed: %s", e)
+            return
+        values = FAST_STRUCT.unpack_from(burst)
+        self._buffer_row(values, FAST_COLUMNS)
+        if self._history is not None:
+            registers = self._registers
+            for index, value in zip(FAST_INDEX, values):
+                registers[index] = value
+            self._history.append(time(), KIND_SAMPLE, registers)
+
+    @callback
+    def async_start_polling(self) -> None:
+        """Start polling, with a first refresh right away."""
+        if self._poll_task is None:
+            self._poll_task = self.hass.async_create_background_task(
+                self._async_poll(), f"{DOMAIN} poll"
             )
-            _LOGGER.debug("Remaining Capacity %d mAh", remaining_battery_capacity)
 
-            if not self._is_online:
-                # If there is no power read these registers
-                remaining_time = int.from_bytes(data[8:10], "little", signed=True)
-                _LOGGER.debug("Time To Empty %d min", remaining_time)
-            else:
-                # ... when charging read other registers
-                if battery_current > 0:
-                    remaining_time = int.from_bytes(data[10:12], "little", signed=True)
-                else:
-                    # Avoid intrepeting 0xFFFF as a number
-                    remaining_time = 0
-                _LOGGER.debug("Time To Full %d min", remaining_time)
-
-            # Simplistic solution where both types of values go to the same buffer
-            self._remaining_time_buf.append(remaining_time)
-
-            data = self._bus.read_i2c_block_data(self._addr, REG_CELL_1_VOLTAGE, 0x08)
-            cell1_voltage = int.from_bytes(data[0:2], "little", signed=True)
-            cell2_voltage = int.from_bytes(data[2:4], "little", signed=True)
-            cell3_voltage = int.from_bytes(data[4:6], "little", signed=True)
-            cell4_voltage = int.from_bytes(data[6:8], "little", signed=True)
-            _LOGGER.debug("Cell Voltage1 %d mV", cell1_voltage)
-            _LOGGER.debug("Cell Voltage2 %d mV", cell2_voltage)
-            _LOGGER.debug("Cell Voltage3 %d mV", cell3_voltage)
-            _LOGGER.debug("Cell Voltage4 %d mV", cell4_voltage)
+    @callback
+    def async_stop_polling(self) -> None:
+        """Stop polling."""
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    async def _async_poll(self) -> None:
+        """Refresh now, then on the update interval grid.
+
+        Devices on the same bus with the same interval refresh in the same
+        event loop iteration, so that the bus batches their polls into one
+        executor job.
+        """
+        while True:
+            await self.async_refresh()
+            interval = self._interval.total_seconds()
+            await asyncio.sleep(interval - self.hass.loop.time() % interval)
+
+    @callback
+    def async_start_sampling(self) -> None:
+        """Start the background oversampling engine if configured."""
+        if self._sample_interval and self._sample_task is None:
+            self._sample_task = self.hass.async_create_background_task(
+                self._async_sample(), f"{DOMAIN} oversampling"
+            )
+
+    @callback
+    def async_stop_sampling(self) -> None:
+        """Stop the background oversampling engine."""
+        if self._sample_task is not None:
+            self._sample_task.cancel()
+            self._sample_task = None
+
+    async def _async_sample(self) -> None:
+        """Take the oversampling readings on the sampling grid.
+
+        The samples of all devices on the bus go out in one batch. A tick
+        is skipped rather than queued when the bus is slower than the rate.
+        """
+        interval = self._sample_interval
+        while True:
+            await asyncio.sleep(interval - self.hass.loop.time() % interval)
+            await self._bus.async_run_batched(self._sample)
+
+    @callback
+    def _async_set_status(self, status: int) -> None:
+        """Apply the status register, firing power events on VBUS edges."""
+        online = bool(status & 0x20)
+        if self._power_known and online != self._is_online:
+            _LOGGER.info("Power %s", "restored" if online else "lost")
+            self.hass.bus.async_fire(
+                EVENT_POWER_RESTORED if online else EVENT_POWER_LOST,
+                {CONF_UNIQUE_ID: self.id_prefix},
+            )
+        self._power_known = True
+        self._is_online = online
+        self._is_fast_charging = bool(status & 0x40)
+        self._is_charging = bool(status & 0x80)
+
+    @callback
+    def async_start_power_watch(self) -> None:
+        """Start the power watcher if configured."""
+        if self._watch_interval and self._watch_task is None:
+            self._watch_task = self.hass.async_create_background_task(
+                self._async_watch_power(), f"{DOMAIN} power watch"
+            )
+
+    @callback
+    def async_stop_power_watch(self) -> None:
+        """Stop the power watcher."""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+
+    async def _async_watch_power(self) -> None:
+        """Read the status register between polls and push VBUS edges.
+
+        An edge counts once POWER_DEBOUNCE reads in a row agree on it. The
+        flags are published immediately and a full refresh is requested.
+        """
+        streak = 0
+        interval = self._watch_interval
+        while True:
+            # On the interval grid, so that the reads of all devices on the
+            # bus go out in one batch
+            await asyncio.sleep(interval - self.hass.loop.time() % interval)
+            try:
+                status = (
+                    await self._bus.async_run_batched(
+                        self._bus.read_block, self._addr, REG_CHARGING, 1
+                    )
+                )[0]
+            except Exception as e:
+                # Bus failures are reported by the regular polls
+                _LOGGER.debug("Power watch read failed: %s", e)
+                continue
+
+            if not self._power_known or bool(status & 0x20) == self._is_online:
+                streak = 0
+                continue
+            streak += 1
+            if streak < POWER_DEBOUNCE:
+                continue
+            streak = 0
+
+            self._async_set_status(status)
+            self.async_set_updated_data(
+                {
+                    **self.data,
+                    "online": self._is_online,
+                    "charging": self._is_charging,
+                    "fast_charging": self._is_fast_charging,
+                }
+            )
+            await self.async_request_refresh()
 
+    async def _async_update_data(self):
+        try:
+            try:
+                values, stats, added, energy = await self._bus.async_run_batched(
+                    self._poll
+                )
+            except Exception as e:
+                _LOGGER.warning("PIHAT Exception: %s", e)
+                raise
+
+            self._async_set_status(values[FIELD["status"]])
+
+            if self._statistics is not None:
+                self._statistics.async_add(dt_util.utcnow(), added)
+            self._window = stats
+
+            median = stats.percentiles[0]
             self.data = {
-                "charger_voltage": round(median(self._charger_voltage_buf) / 1000, 2),
-                "charger_current": round(median(self._charger_current_buf), 2),
-                "charger_power": round(median(self._charger_power_buf) / 1000, 2),
-                "battery_voltage": round(median(self._battery_voltage_buf) / 1000, 2),
-                "battery_current": round(median(self._battery_current_buf), 2),
-                "soc": round(soc, 1),
-                "remaining_battery_capacity": round(
-                    (remaining_battery_capacity * battery_voltage / 1000) / 1000, 2
-                ),  # in Wh
-                "remaining_time": round(median(self._remaining_time_buf)),
-                "cell1_voltage": cell1_voltage / 1000,
-                "cell2_voltage": cell2_voltage / 1000,
-                "cell3_voltage": cell3_voltage / 1000,
-                "cell4_voltage": cell4_voltage / 1000,
-                "online": self._is_online,
-                "charging": self._is_charging,
-                "fast_charging": self._is_fast_charging,
+                key: round(median[channel] / SCALE.get(key, 1), PRECISION.get(key, 0))
+                for channel, key in enumerate(CHANNELS)
             }
+            self.data.update(
+                {
+                    "soc": round(values[FIELD["soc"]], 1),
+                    "remaining_battery_capacity": round(
+                        values[FIELD["remaining_capacity"]]
+                        * values[FIELD["battery_voltage"]]
+                        / 1000
+                        / 1000,
+                        2,
+                    ),  # in Wh
+                    "remaining_time": round(median[REMAINING_TIME]),
+                    "online": self._is_online,
+                    "charging": self._is_charging,
+                    "fast_charging": self._is_fast_charging,
+                }
+            )
+            self.data.update(
+                {key: round(value, 3) for key, value in zip(ENERGY_KEYS, energy)}
+            )
+            self._energy_store.async_delay_save(
+                lambda: dict(zip(ENERGY_KEYS, energy)), ENERGY_SAVE_DELAY
+            )
+
+            attributes = {}
+            if self._sample_interval:
+                attributes = {
+                    key: {
+                        "mean": round(stats.mean[channel] / SCALE[key], PRECISION[key]),
+                        "min": round(
+                            stats.minimum[channel] / SCALE[key], PRECISION[key]
+                        ),
+                        "max": round(
+                            stats.maximum[channel] / SCALE[key], PRECISION[key]
+                        ),
+                        "samples": stats.count,
+                    }
+                    for channel, key in FAST_CHANNELS
+                }
+
+            # Discharge power from the filtered battery voltage and current
+            power = -median[BATTERY_VOLTAGE] * median[BATTERY_CURRENT] / 1e6
+            discharging = not self._is_online and power > 0
+            if self._model.observe(
+                values[FIELD["soc"]],
+                energy[ENERGY_KEYS.index("energy_discharged")],
+                discharging,
+            ):
+                self._model_store.async_delay_save(
+                    self._model.as_dict, MODEL_SAVE_DELAY
+                )
+            prediction = self._model.predict(values[FIELD["soc"]], power)
+            self.data["predicted_time_to_empty"] = None
+            if discharging and prediction is not None:
+                self.data["predicted_time_to_empty"] = round(prediction.minutes)
+                attributes["predicted_time_to_empty"] = {
+                    "lower": round(prediction.lower),
+                    "upper": round(prediction.upper),
+                    "observations": self._model.observations,
+                }
+            self.attributes = attributes
+
+            self._snapshot_store.async_delay_save(
+                lambda: self.data, SNAPSHOT_SAVE_DELAY
+            )
+            if self._adaptive is not None:
+                self._adapt_interval()
 
-            _LOGGER.debug(f"UPS_HAT_E DATA 2: {self.data}")
+            _LOGGER.debug("UPS_HAT_E DATA 2: %s", self.data)
             return self.data
         except Exception as e:
             raise UpdateFailed(f"Error updating data: {e}")
 
-    def _writeByte(self, register, data):
-        temp = [0]
-        temp[0] = data & 0xFF
-        self._bus.write_i2c_block_data(self._addr, register, temp)
+    def _adapt_interval(self) -> None:
+        """Pick the next update interval from the power state and trends."""
+        adaptive = self._adaptive
+        now = monotonic()
+        voltage = self.data["battery_voltage"]
+        current = self.data["battery_current"]
+        busy = not self._is_online or self._is_charging
+        if not busy and self._adapted_from is not None:
+            then, last_voltage, last_current = self._adapted_from
+            minutes = max(now - then, 1) / 60
+            busy = (
+                abs(voltage - last_voltage) / minutes > adaptive[CONF_VOLTAGE_RATE]
+                or abs(current - last_current) / minutes > adaptive[CONF_CURRENT_RATE]
+            )
+        self._adapted_from = (now, voltage, current)
+
+        seconds = self._interval.total_seconds()
+        seconds = (
+            adaptive[CONF_MINIMUM] if busy else min(seconds * 2, adaptive[CONF_MAXIMUM])
+        )
+        if seconds != self._interval.total_seconds():
+            _LOGGER.debug("Next update in %.0f s", seconds)
+            self._interval = timedelta(seconds=seconds)
+
+    async def async_restore(self) -> None:
+        """Restore the last snapshot, counters, discharge curve and timings."""
+        if (stored := await self._snapshot_store.async_load()) is not None:
+            self.data = stored
+        if (stored := await self._energy_store.async_load()) is not None:
+            self._energy[:] = [stored.get(key, 0.0) for key in ENERGY_KEYS]
+        if (stored := await self._model_store.async_load()) is not None:
+            self._model = DischargeModel(stored)
+        await self._orchestrator.async_setup()
+        if self._statistics is not None:
+            await self._statistics.async_restore()
+        if self._history is not None:
+            await self._bus.async_run(self._history.open)
+        if self._capture is not None:
+            await self._bus.async_run(self._capture.open)
+
+    async def async_export_history(
+        self, start: datetime, end: datetime
+    ) -> dict[str, str | int]:
+        """Export the on-disk history of a time range for post-mortem analysis."""
+        if self._history is None:
+            raise HomeAssistantError("The sample history is not enabled")
+        path = self.hass.config.path(
+            f"{DOMAIN}_{self.id_prefix}_{dt_util.as_utc(start):%Y%m%d%H%M%S}.csv"
+        )
+        # Only the copy is made on the I2C worker, so that a day of records
+        # does not hold up the polls while it is written out
+        snapshot = await self._bus.async_run(self._history.snapshot)
+        count = await self.hass.async_add_executor_job(
+            _export_history,
+            path,
+            snapshot,
+            dt_util.as_timestamp(start),
+            dt_util.as_timestamp(end),
+        )
+        return {"path": path, "records": count}
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Notify only the listeners whose data key changed.
+
+        Entities register with their data key as context. Listeners without
+        a context, and all listeners on availability changes or the first
+        update, are always notified.
+        """
+        self._update_diagnostics()
+        data = {**(self.data or {}), **self.diagnostics}
+        previous = self._notified_data
+        if previous is None or self.last_update_success != self._notified_success:
+            changed = None
+        else:
+            changed = {key for key, value in data.items() if previous.get(key) != value}
+            changed.update(
+                key
+                for key, stats in self.attributes.items()
+                if self._notified_stats.get(key) != stats
+            )
+        self._notified_data = data
+        self._notified_stats = self.attributes
+        self._notified_success = self.last_update_success
+
+        # The state writes are only known once the other listeners ran, so
+        # their sensor reports this update rather than the one before
+        self.state_writes = 0
+        counters = []
+        for update_callback, context in list(self._listeners.values()):
+            if context == "state_writes":
+                counters.append(update_callback)
+            elif changed is None or context is None or context in changed:
+                update_callback()
+        self._metrics.update(self.state_writes)
+        writes = self.diagnostics["state_writes"] = data["state_writes"] = (
+            self._metrics.state_writes
+        )
+        if changed is None or previous.get("state_writes") != writes:
+            for update_callback in counters:
+                update_callback()
+
+    @callback
+    def _update_diagnostics(self) -> None:
+        """Refresh the diagnostic values and their attributes from the metrics."""
+        metrics = self._metrics
+        # The poll bursts, without the power watcher's status reads
+        burst = Histogram.merged(
+            histogram
+            for (register, length), histogram in list(metrics.latency.items())
+            if register == REG_BURST_START and length > 1
+        )
+        ages = self.register_ages()
+        self.diagnostics = {
+            "bus_latency": burst.quantile(0.95),
+            "bus_errors": sum(metrics.errors.values()),
+            "decode_time": round(metrics.decode.last, 3),
+            "register_age": max(
+                (age for age in ages.values() if age is not None), default=None
+            ),
+        }
+        self.attributes = {
+            **self.attributes,
+            "bus_latency": {
+                "p50": burst.quantile(0.5),
+                "p99": burst.quantile(0.99),
+                "max": round(burst.maximum, 1),
+            },
+            "bus_errors": {
+                f"{register:#04x}": count
+                for register, count in sorted(metrics.errors.items())
+            },
+            "decode_time": {"max": round(metrics.decode.maximum, 3)},
+            "register_age": ages,
+        }
+
+    def telemetry(
+        self,
+    ) -> tuple[
+        tuple[float, ...], tuple[int, ...], tuple[float, ...], WindowStats | None
+    ]:
+        """Return the latest buffered row, raw registers and energy counters.
+
+        Also returns the window statistics of the last update, None before
+        the first one. Called on the event loop while the worker may be writing; each
+        value is replaced whole, so every one of them is consistent.
+        """
+        return (
+            tuple(self._row),
+            tuple(self._registers),
+            tuple(self._energy),
+            self._window,
+        )
+
+    @property
+    def metrics(self) -> BusMetrics:
+        """Return the bus metrics of the device."""
+        return self._metrics
+
+    @property
+    def bus_reopens(self) -> int:
+        """Return how often the bus of the device was reopened."""
+        return self._bus.reopens
+
+    def register_ages(self) -> dict[str, int | None]:
+        """Return the seconds since each register group was last read."""
+        now = self._clock()
+        return {
+            name: round(now - self._read_at[name]) if name in self._read_at else None
+            for name in GROUP_NAMES
+        }
+
+    def diagnostics_dump(self) -> dict[str, Any]:
+        """Return the state of the I2C path for the diagnostics dump."""
+        return {
+            "bus": self._bus.bus_number,
+            "addr": f"{self._addr:#04x}",
+            "update_interval": self._interval.total_seconds(),
+            "oversampling_interval": self._sample_interval,
+            "combined_transactions": self._bus.combined,
+            "bus_jobs": self._bus.jobs,
+            "bus_reopens": self._bus.reopens,
+            "last_update_success": self.last_update_success,
+            "last_exception": (
+                repr(self.last_exception) if self.last_exception else None
+            ),
+            "loop_time_max_ms": round(self._bus.loop_time_max * 1000, 3),
+            "bus_time_max_ms": round(self._bus.bus_time_max * 1000, 3),
+            "registers": dict(zip(FIELD, self._registers)),
+            "stale_groups": self._stale,
+            "register_ages": self.register_ages(),
+            "refresh": {name: self._refresh.get(name, 0) for name in REFRESH_GROUPS},
+            "metrics": self._metrics.as_dict(),
+            "shutdown": self._orchestrator.as_dict(),
+        }
+
+    async def shutdown(self) -> CommandResult | None:
+        """Shut down the UPS Hat E device if not plugged in.
+
+        Returns the outcome of the shutdown command, or None when on mains
+        or before the power state has been read.
+        """
+        # Only allow shutdown if known not to be plugged in
+        if not self._power_known or self._is_online:
+            return None
+        # Reading the command register back is not known to return the
+        # command on the HAT, so the acknowledged write has to do. The bus
+        # may be backing off, but this may be the last chance to send it.
+        result = await self._bus.async_write_confirmed(
+            self._addr, REG_REBOOT, CONST_SHUTDOWN_CMD, readback=False, urgent=True
+        )
+        if result.confirmed:
+            self._orchestrator.async_command_sent()
+        return result
+
+    def runtime_left(self) -> float | None:
+        """Return the seconds the battery is expected to last, if on battery."""
+        if not self._power_known or self._is_online or not self.data:
+            return None
+        # The learned prediction, else the HAT's own time to empty
+        minutes = self.data.get("predicted_time_to_empty")
+        if minutes is None:
+            minutes = self.data.get("remaining_time")
+        return minutes * 60 if minutes is not None else None
+
+    async def async_close(self) -> None:
+        """Stop polling and close the history and capture files.
 
-    async def shutdown(self):
-        """Shut down the UPS Hat E device if not plugged in."""
-        # Only allow shutdown if not plugged id
-        if not self._is_online:
-            self._writeByte(REG_REBOOT, CONST_SHUTDOWN_CMD)
+        The bus is shared with the other devices and closed by the caller.
+        """
+        self.async_stop_polling()
+        self.async_stop_power_watch()
+        self.async_stop_sampling()
+        await self.async_shutdown()
+        if self._statistics is not None:
+            await self._statistics.async_close()
+        if self._history is not None:
+            await self._bus.async_run(self._history.close)
+        if self._capture is not None:
+            await self._bus.async_run(self._capture.close)
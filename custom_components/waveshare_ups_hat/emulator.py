@@ -0,0 +1,227 @@
+"""UPS Hat E register map emulator."""
+
+from __future__ import annotations
+
+from ctypes import memmove
+import errno
+import logging
+import random
+import struct
+import time
+from typing import Any, NamedTuple
+
+from smbus2 import I2cFunc, i2c_msg
+
+from .const import (
+    CONST_SHUTDOWN_CMD,
+    REG_BATSOC,
+    REG_BATVOLTAGE,
+    REG_BUSVOLTAGE,
+    REG_CELL_1_VOLTAGE,
+    REG_CHARGING,
+    REG_CURRENT,
+    REG_POWER,
+    REG_REBOOT,
+    REG_REM_BAT_CAP,
+    REG_REM_BAT_TIME,
+    REG_REM_CHARGE_TIME,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+REGISTER_SPACE = 0x40
+WORD = struct.Struct("<h")
+
+# Battery pack model: four cells in series
+CELLS = 4
+CAPACITY = 4000  # mAh
+CELL_EMPTY = 3000  # mV at 0 % SoC
+CELL_FULL = 4200  # mV at 100 % SoC
+CHARGE_CURRENT = 1000  # mA, fast charge
+TRICKLE_SOC = 95  # charge slower above this SoC
+LOAD_CURRENT = 1200  # mA drawn from the battery on outage
+VBUS = 9000  # mV, USB-C PD
+
+
+class Phase(NamedTuple):
+    """One step of a scenario: mains present or not for some seconds."""
+
+    seconds: float
+    online: bool
+
+
+# Scenarios loop over their phases; times are emulated seconds
+SCENARIOS: dict[str, tuple[float, tuple[Phase, ...]]] = {
+    # name: (initial SoC, phases)
+    "idle": (100.0, (Phase(3600, True),)),
+    "charge": (20.0, (Phase(3600, True),)),
+    "discharge": (100.0, (Phase(3600, False),)),
+    "outage": (90.0, (Phase(600, True), Phase(300, False))),
+}
+
+
+class EmulatedSMBus:
+    """Drop-in stand-in for smbus2.SMBus backed by a simulated UPS Hat E.
+
+    The register map is derived from a simple battery model driven by a
+    scripted scenario, on emulated time (wall time multiplied by speed).
+    Every transaction can be delayed by latency seconds and fails with
+    EIO with probability error_rate, as a flaky bus would.
+    """
+
+    funcs = I2cFunc.I2C | I2cFunc.SMBUS_READ_I2C_BLOCK | I2cFunc.SMBUS_WRITE_I2C_BLOCK
+
+    def __init__(
+        self,
+        bus: int,
+        scenario: str = "idle",
+        speed: float = 1.0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+    ) -> None:
+        """Initialize the emulator; bus is ignored."""
+        self.registers = bytearray(REGISTER_SPACE)
+        self._soc, self._phases = SCENARIOS[scenario]
+        self._cycle = sum(phase.seconds for phase in self._phases)
+        self._speed = speed
+        self._latency = latency
+        self._error_rate = error_rate
+        self._started = self._updated = time.monotonic()
+        self.shutdown = False
+        self._update()
+
+    def _online(self, elapsed: float) -> bool:
+        elapsed %= self._cycle
+        for phase in self._phases:
+            if elapsed < phase.seconds:
+                return phase.online
+            elapsed -= phase.seconds
+        return self._phases[-1].online
+
+    def _update(self) -> None:
+        """Advance the battery model and refresh the register map."""
+        now = time.monotonic()
+        hours = (now - self._updated) * self._speed / 3600
+        self._updated = now
+        online = self._online((now - self._started) * self._speed)
+
+        if online and self._soc < 100:
+            current = CHARGE_CURRENT if self._soc < TRICKLE_SOC else CHARGE_CURRENT / 8
+        elif online:
+            current = 0
+        else:
+            current = -LOAD_CURRENT if self._soc > 0 else 0
+        self._soc = min(max(self._soc + current * hours / CAPACITY * 100, 0.0), 100.0)
+
+        cell = round(CELL_EMPTY + (CELL_FULL - CELL_EMPTY) * self._soc / 100)
+        remaining = round(CAPACITY * self._soc / 100)
+        status = 0x20 if online else 0
+        if online and current:
+            status |= 0xC2 if current == CHARGE_CURRENT else 0x83
+        elif online:
+            status |= 0x05
+
+        regs = self.registers
+        regs[REG_CHARGING] = status
+        vbus = VBUS if online else 0
+        charger_current = round(current * CELLS * cell / vbus) + 100 if vbus else 0
+        WORD.pack_into(regs, REG_BUSVOLTAGE, vbus)
+        WORD.pack_into(regs, REG_BUSVOLTAGE + 2, charger_current)
+        WORD.pack_into(regs, REG_POWER, round(vbus * charger_current / 1000))
+        WORD.pack_into(regs, REG_BATVOLTAGE, CELLS * cell)
+        WORD.pack_into(regs, REG_CURRENT, round(current))
+        WORD.pack_into(regs, REG_BATSOC, round(self._soc))
+        WORD.pack_into(regs, REG_REM_BAT_CAP, remaining)
+        WORD.pack_into(
+            regs,
+            REG_REM_BAT_TIME,
+            round(remaining / LOAD_CURRENT * 60) if not online else -1,
+        )
+        WORD.pack_into(
+            regs,
+            REG_REM_CHARGE_TIME,
+            round((CAPACITY - remaining) / current * 60) if current > 0 else -1,
+        )
+        for index in range(CELLS):
+            WORD.pack_into(regs, REG_CELL_1_VOLTAGE + 2 * index, cell)
+
+    def _transaction(self) -> None:
+        if self._latency:
+            time.sleep(self._latency)
+        if self._error_rate and random.random() < self._error_rate:
+            raise OSError(errno.EIO, "Emulated I/O error")
+        self._update()
+
+    def read_i2c_block_data(
+        self, i2c_addr: int, register: int, length: int
+    ) -> list[int]:
+        """Read a register block."""
+        self._transaction()
+        return list(self.registers[register : register + length])
+
+    def write_i2c_block_data(
+        self, i2c_addr: int, register: int, data: list[int]
+    ) -> None:
+        """Write a register block."""
+        self._transaction()
+        if register == REG_REBOOT and data[:1] == [CONST_SHUTDOWN_CMD]:
+            _LOGGER.info("Emulated UPS Hat E received the shutdown command")
+            self.shutdown = True
+            return
+        self.registers[register : register + len(data)] = bytes(data)
+
+    def i2c_rdwr(self, *messages: i2c_msg) -> None:
+        """Run a combined write (register pointer) / read transaction."""
+        self._transaction()
+        register = 0
+        for message in messages:
+            if message.flags:
+                data = bytes(self.registers[register : register + message.len])
+                memmove(message.buf, data, len(data))
+            else:
+                register = bytes(message)[0]
+
+    def close(self) -> None:
+        """Close the emulated bus."""
+
+
+class EmulatedBus:
+    """Drop-in stand-in for smbus2.SMBus with an emulated HAT per address.
+
+    Each HAT runs its own scenario with its own settings. Transactions to
+    an address without a HAT fail with ENXIO, as nothing acknowledges it.
+    """
+
+    funcs = EmulatedSMBus.funcs
+
+    def __init__(self, bus: int, devices: dict[int, dict[str, Any]]) -> None:
+        """Initialize the emulated HATs; devices maps addresses to settings."""
+        self.devices = {
+            addr: EmulatedSMBus(bus, **settings) for addr, settings in devices.items()
+        }
+
+    def _device(self, i2c_addr: int) -> EmulatedSMBus:
+        if (device := self.devices.get(i2c_addr)) is None:
+            raise OSError(errno.ENXIO, f"No device at {i2c_addr:#04x}")
+        return device
+
+    def read_i2c_block_data(
+        self, i2c_addr: int, register: int, length: int
+    ) -> list[int]:
+        """Read a register block."""
+        return self._device(i2c_addr).read_i2c_block_data(i2c_addr, register, length)
+
+    def write_i2c_block_data(
+        self, i2c_addr: int, register: int, data: list[int]
+    ) -> None:
+        """Write a register block."""
+        self._device(i2c_addr).write_i2c_block_data(i2c_addr, register, data)
+
+    def i2c_rdwr(self, *messages: i2c_msg) -> None:
+        """Run a combined transaction on the HAT addressed by its messages."""
+        self._device(messages[0].addr).i2c_rdwr(*messages)
+
+    def close(self) -> None:
+        """Close the emulated bus."""
+        for device in self.devices.values():
+            device.close()
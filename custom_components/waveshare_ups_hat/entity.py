@@ -1,7 +1,10 @@
 """UPS Hat E entity."""
 
-from homeassistant.core import callback
+from time import monotonic
+
+from homeassistant.core import CALLBACK_TYPE, callback
 from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .const import DOMAIN
@@ -11,9 +14,19 @@ from .coordinator import UpsHatECoordinator
 class UpsHatEEntity(CoordinatorEntity):
     """UPS Hat E entity."""
 
-    def __init__(self, coordinator: UpsHatECoordinator) -> None:
-        """Initialize a UPS Hat E entity."""
+    def __init__(
+        self, coordinator: UpsHatECoordinator, name: str, key: str | None = None
+    ) -> None:
+        """Initialize a UPS Hat E entity.
+
+        Name and unique_id are derived from the configured prefixes once,
+        here, rather than on every state write.
+        """
         self._coordinator = coordinator
+        # Coordinator data key the entity reports
+        self._key = key
+        self._attr_name = f"{coordinator.name_prefix} {name}"
+        self._attr_unique_id = f"{coordinator.id_prefix}_{name}"
         self._device_id = self._coordinator.id_prefix
         self._attr_device_info = DeviceInfo(
             identifiers={(DOMAIN, coordinator.id_prefix)},
@@ -21,20 +34,108 @@ class UpsHatEEntity(CoordinatorEntity):
             manufacturer="Waveshare Pi UPS Hat E",
         )
 
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
+        # Change-only publishing: last written value/availability and time
+        self._deadband = coordinator.deadbands.get(self._key)
+        self._written_value = None
+        self._written_stats = None
+        self._written_available: bool | None = None
+        self._written_at = 0.0
+        # Set while a change is held back: the listener is only called again
+        # when the data changes, so the entity writes it on its own heartbeat
+        self._held_back = False
+        self._unsub_heartbeat: CALLBACK_TYPE | None = None
 
-    @property
-    def name(self):
-        """Return the name of the UPS Hat E entity."""
-        return self._coordinator.name_prefix + " " + self._name
+        """Pass coordinator to CoordinatorEntity, keyed for change tracking."""
+        super().__init__(coordinator, self._key)
 
     @property
-    def unique_id(self):
-        """Return the unique ID for the UPS Hat E entity."""
-        return self._coordinator.id_prefix + "_" + self._name
+    def extra_state_attributes(self):
+        """Return the extra attributes of the key, if any."""
+        if self._key is None:
+            return None
+        return self._coordinator.attributes.get(self._key)
+
+    def _value(self):
+        """Return the coordinator value of the key."""
+        return self._coordinator.data.get(self._key)
+
+    def _should_write(self, heartbeat_due: bool = False) -> bool:
+        """Return True if the value moved enough to be worth a state write.
+
+        Availability changes, non-numeric values and moves beyond the
+        deadband are always written. Smaller moves are held back until
+        the heartbeat has elapsed since the last write.
+        """
+        value = self._value() if self._key else None
+        stats = self.extra_state_attributes
+        available = self.available
+        now = monotonic()
+        last = self._written_value
+
+        if (
+            value == last
+            and stats == self._written_stats
+            and available == self._written_available
+        ):
+            self._held_back = False
+            return False
+
+        if (
+            available == self._written_available
+            and self._deadband is not None
+            and isinstance(value, (int, float))
+            and not isinstance(value, bool)
+            and isinstance(last, (int, float))
+        ):
+            absolute, relative = self._deadband
+            threshold = max(absolute, abs(last) * relative / 100)
+            heartbeat = self._coordinator.heartbeat
+            if (
+                abs(value - last) <= threshold
+                and not heartbeat_due
+                and (not heartbeat or now - self._written_at < heartbeat)
+            ):
+                self._held_back = True
+                return False
+
+        self._held_back = False
+        self._written_value = value
+        self._written_stats = stats
+        self._written_available = available
+        self._written_at = now
+        return True
 
     @callback
-    def _handle_coordinator_update(self) -> None:
+    def _handle_coordinator_update(self, heartbeat_due: bool = False) -> None:
         """Handle updated data from the coordinator."""
-        self.async_write_ha_state()
+        if self._should_write(heartbeat_due):
+            self._cancel_heartbeat()
+            self._coordinator.state_writes += 1
+            self.async_write_ha_state()
+        elif (
+            self._held_back
+            and self._unsub_heartbeat is None
+            and (heartbeat := self._coordinator.heartbeat)
+        ):
+            self._unsub_heartbeat = async_call_later(
+                self.hass,
+                max(heartbeat - (monotonic() - self._written_at), 0),
+                self._async_heartbeat,
+            )
+
+    @callback
+    def _async_heartbeat(self, _now) -> None:
+        """Write the change held back since the last write."""
+        self._unsub_heartbeat = None
+        self._handle_coordinator_update(heartbeat_due=True)
+
+    @callback
+    def _cancel_heartbeat(self) -> None:
+        if self._unsub_heartbeat is not None:
+            self._unsub_heartbeat()
+            self._unsub_heartbeat = None
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Stop the heartbeat when the entity is removed."""
+        self._cancel_heartbeat()
+        await super().async_will_remove_from_hass()
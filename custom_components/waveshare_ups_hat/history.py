@@ -0,0 +1,136 @@
+"""UPS Hat E on-disk sample history."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator, Sequence
+import logging
+import mmap
+import os
+import struct
+from typing import NamedTuple
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"UPSH"
+VERSION = 1
+
+# magic, version, record size, capacity, next record, record count
+HEADER = struct.Struct("<4sHHIII")
+HEADER_SIZE = 32
+
+# Record kinds
+KIND_POLL = 0
+KIND_SAMPLE = 1
+
+
+class HistorySnapshot(NamedTuple):
+    """Copy of the records of a history, oldest first, safe to read anywhere."""
+
+    record: struct.Struct
+    data: bytes
+
+    def records(self, start: float, end: float) -> Iterator[tuple]:
+        """Yield the records with start <= timestamp <= end, oldest first."""
+        for record in self.record.iter_unpack(self.data):
+            if start <= record[0] <= end:
+                yield record
+
+
+class History:
+    """Fixed-record binary ring file, memory-mapped.
+
+    Each record holds a wall-clock timestamp, the record kind and every
+    raw register value. Appending packs straight into the mapping, so the
+    file never grows and survives Home Assistant restarts. Not thread
+    safe: only use it from the I2C worker.
+    """
+
+    def __init__(self, path: str, fields: str, capacity: int) -> None:
+        """Initialize the history; fields is the struct format of one sample."""
+        self.path = path
+        self.capacity = capacity
+        self.record = struct.Struct("<dB" + fields)
+        self._mm: mmap.mmap | None = None
+        self._next = 0
+        self._count = 0
+
+    def open(self) -> None:
+        """Map the file, reusing its records if the layout still matches."""
+        size = HEADER_SIZE + self.record.size * self.capacity
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        magic, version, record_size, capacity, next_, count = HEADER.unpack_from(
+            self._mm
+        )
+        if (magic, version, record_size, capacity) == (
+            MAGIC,
+            VERSION,
+            self.record.size,
+            self.capacity,
+        ):
+            self._next, self._count = next_, count
+            _LOGGER.debug("Reopened history %s with %d records", self.path, count)
+        else:
+            self._next = self._count = 0
+            self._write_header()
+
+    def _write_header(self) -> None:
+        HEADER.pack_into(
+            self._mm,
+            0,
+            MAGIC,
+            VERSION,
+            self.record.size,
+            self.capacity,
+            self._next,
+            self._count,
+        )
+
+    def append(self, timestamp: float, kind: int, values: Sequence[int]) -> None:
+        """Append one record, overwriting the oldest when full."""
+        if self._mm is None:
+            return
+        self.record.pack_into(
+            self._mm,
+            HEADER_SIZE + self._next * self.record.size,
+            timestamp,
+            kind,
+            *values,
+        )
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self._write_header()
+
+    def snapshot(self) -> HistorySnapshot:
+        """Return a copy of all records, oldest first.
+
+        A plain memory copy, short enough for the I2C worker; decoding the
+        copy can then happen anywhere else.
+        """
+        size = self.record.size
+        if self._mm is None:
+            return HistorySnapshot(self.record, b"")
+        first = (self._next - self._count) % self.capacity
+        offset = HEADER_SIZE + first * size
+        if first + self._count <= self.capacity:
+            data = self._mm[offset : offset + self._count * size]
+        else:
+            data = (
+                self._mm[offset : HEADER_SIZE + self.capacity * size]
+                + self._mm[HEADER_SIZE : HEADER_SIZE + self._next * size]
+            )
+        return HistorySnapshot(self.record, data)
+
+    def close(self) -> None:
+        """Flush and unmap the file."""
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
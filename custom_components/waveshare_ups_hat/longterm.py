@@ -0,0 +1,145 @@
+"""UPS Hat E long-term statistics."""
+
+from __future__ import annotations
+
+from datetime import datetime
+import logging
+from typing import Any
+
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util, slugify
+
+from .const import DOMAIN, STORAGE_VERSION
+from .ringbuffer import WindowStats
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds the running hour may go unsaved; a crash loses at most this much
+SAVE_DELAY = 60
+
+
+class LongTermStatistics:
+    """Hourly mean/min/max of buffered channels, imported as external statistics.
+
+    Every poll folds its window statistics into the running hour. When the
+    hour rolls over it is imported with one recorder job per channel,
+    instead of one state row per poll and entity. The recorder only
+    accepts hourly external statistics; its 5-minute short-term table is
+    left alone. The running hour is kept in storage, so that after a
+    restart mid-hour the import still covers the whole hour.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        id_prefix: str,
+        name_prefix: str,
+        channels: dict[str, tuple[int, int, int, str | None]],
+    ) -> None:
+        """Initialize the aggregator.
+
+        channels maps each data key to its (buffer column, scale, precision,
+        unit).
+        """
+        self._hass = hass
+        self._channels = channels
+        self._metadata = {
+            key: StatisticMetaData(
+                has_mean=True,
+                has_sum=False,
+                name=f"{name_prefix} {key.replace('_', ' ').title()}",
+                source=DOMAIN,
+                statistic_id=f"{DOMAIN}:{slugify(id_prefix)}_{key}",
+                unit_of_measurement=unit,
+            )
+            for key, (_, _, _, unit) in channels.items()
+        }
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{id_prefix}.statistics")
+        self._hour: datetime | None = None
+        # Running aggregate of the hour, in raw register units
+        self._count = 0
+        self._sum = dict.fromkeys(channels, 0.0)
+        self._min: dict[str, float] = {}
+        self._max: dict[str, float] = {}
+
+    async def async_restore(self) -> None:
+        """Restore the running hour saved before the last stop."""
+        if (stored := await self._store.async_load()) is None:
+            return
+        if (hour := dt_util.parse_datetime(stored["hour"] or "")) is None:
+            return
+        # Channels added to the configuration since start from scratch
+        channels = set(self._channels) & set(stored["sum"])
+        self._hour = hour
+        self._count = stored["count"]
+        self._sum.update({key: stored["sum"][key] for key in channels})
+        self._min = {key: stored["min"][key] for key in channels}
+        self._max = {key: stored["max"][key] for key in channels}
+
+    def _as_stored(self) -> dict[str, Any]:
+        return {
+            "hour": self._hour.isoformat() if self._hour is not None else None,
+            "count": self._count,
+            "sum": self._sum,
+            "min": self._min,
+            "max": self._max,
+        }
+
+    @callback
+    def async_add(self, now: datetime, stats: WindowStats) -> None:
+        """Fold statistics of the rows new since the last call into the hour."""
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        if self._hour is not None and hour != self._hour:
+            self.async_flush()
+            self._count = 0
+            self._sum = dict.fromkeys(self._channels, 0.0)
+            self._min, self._max = {}, {}
+        self._hour = hour
+
+        self._count += stats.count
+        for key, (column, _, _, _) in self._channels.items():
+            self._sum[key] += stats.mean[column] * stats.count
+            self._min[key] = min(
+                self._min.get(key, stats.minimum[column]), stats.minimum[column]
+            )
+            self._max[key] = max(
+                self._max.get(key, stats.maximum[column]), stats.maximum[column]
+            )
+        self._store.async_delay_save(self._as_stored, SAVE_DELAY)
+
+    async def async_close(self) -> None:
+        """Import the running hour so far and save it for the next start."""
+        self.async_flush()
+        await self._store.async_save(self._as_stored())
+
+    @callback
+    def async_flush(self) -> None:
+        """Import the running hour, even if incomplete.
+
+        Importing an hour again replaces it, so the hour is imported once
+        more, in full, when it rolls over.
+        """
+        count, total, minimum, maximum = self._count, self._sum, self._min, self._max
+        if not count or self._hour is None:
+            return
+        if "recorder" not in self._hass.config.components:
+            _LOGGER.debug("Recorder not loaded, dropping statistics of %s", self._hour)
+            return
+
+        for key, (_, scale, precision, _) in self._channels.items():
+            async_add_external_statistics(
+                self._hass,
+                self._metadata[key],
+                [
+                    StatisticData(
+                        start=self._hour,
+                        mean=round(total[key] / count / scale, precision),
+                        min=round(minimum[key] / scale, precision),
+                        max=round(maximum[key] / scale, precision),
+                    )
+                ],
+            )
+        _LOGGER.debug("Imported statistics of %s from %d samples", self._hour, count)
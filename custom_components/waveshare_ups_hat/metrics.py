@@ -0,0 +1,130 @@
+"""UPS Hat E hot path instrumentation."""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Iterable
+from math import inf
+from typing import Any
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 250, inf)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, in milliseconds."""
+
+    def __init__(self) -> None:
+        """Initialize an empty histogram."""
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.maximum = 0.0
+
+    def observe(self, ms: float) -> None:
+        """Add one observation."""
+        self.buckets[bisect_left(BUCKETS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.last = ms
+        self.maximum = max(self.maximum, ms)
+
+    @classmethod
+    def merged(cls, histograms: Iterable[Histogram]) -> Histogram:
+        """Return one histogram holding the observations of all given ones."""
+        merged = cls()
+        for histogram in histograms:
+            merged.buckets = [
+                ours + theirs for ours, theirs in zip(merged.buckets, histogram.buckets)
+            ]
+            merged.count += histogram.count
+            merged.total += histogram.total
+            merged.maximum = max(merged.maximum, histogram.maximum)
+        return merged
+
+    def quantile(self, q: float) -> float | None:
+        """Return the upper bound of the bucket holding the q quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound if bound != inf else self.maximum
+        return self.maximum
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the histogram for the diagnostics dump."""
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else None,
+            "last_ms": round(self.last, 3),
+            "max_ms": round(self.maximum, 3),
+            "buckets": {
+                f"le_{bound}": count for bound, count in zip(BUCKETS, self.buckets)
+            },
+        }
+
+
+class BusMetrics:
+    """Counters and histograms of the I2C path.
+
+    Transactions are recorded on the I2C worker and read on the event
+    loop; every update is a single assignment or increment, so readers
+    may see a snapshot that is one transaction behind but never a torn one.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty metrics."""
+        # Transaction latency per register and length, so that e.g. the
+        # one byte status reads do not blend into the burst reads at the
+        # same register; failed and retried transactions per register
+        self.latency: defaultdict[tuple[int, int], Histogram] = defaultdict(Histogram)
+        self.errors: defaultdict[int, int] = defaultdict(int)
+        self.retries: defaultdict[int, int] = defaultdict(int)
+        # Time to decode a burst and aggregate the buffers
+        self.decode = Histogram()
+        # State writes caused by the last update, and in total
+        self.state_writes = 0
+        self.state_writes_total = 0
+        self.updates = 0
+
+    def transaction(self, register: int, length: int, ms: float, ok: bool) -> None:
+        """Record one bus transaction of length bytes starting at register."""
+        self.latency[register, length].observe(ms)
+        if not ok:
+            self.errors[register] += 1
+
+    def update(self, writes: int) -> None:
+        """Record the state writes caused by one coordinator update."""
+        self.state_writes = writes
+        self.state_writes_total += writes
+        self.updates += 1
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return all metrics for the diagnostics dump."""
+        return {
+            "latency": {
+                f"{register:#04x}:{length}": histogram.as_dict()
+                for (register, length), histogram in sorted(self.latency.items())
+            },
+            "errors": {
+                f"{register:#04x}": count
+                for register, count in sorted(self.errors.items())
+            },
+            "retries": {
+                f"{register:#04x}": count
+                for register, count in sorted(self.retries.items())
+            },
+            "decode": self.decode.as_dict(),
+            "state_writes_last_update": self.state_writes,
+            "state_writes_per_update": (
+                round(self.state_writes_total / self.updates, 2)
+                if self.updates
+                else None
+            ),
+            "updates": self.updates,
+        }
@@ -0,0 +1,222 @@
+"""UPS Hat E metrics endpoint in the Prometheus text format."""
+
+from __future__ import annotations
+
+from http import HTTPStatus
+from math import inf
+
+from aiohttp import web
+
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.const import (
+    UnitOfElectricCurrent,
+    UnitOfElectricPotential,
+    UnitOfPower,
+    UnitOfTime,
+)
+
+from .const import DOMAIN, ENERGY_KEYS, REGISTERS
+from .coordinator import CHANNELS, FIELD, SCALE, UNITS, UpsHatECoordinator
+from .metrics import BUCKETS, Histogram
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = DOMAIN
+
+# Metric name suffix and factor to the base unit of each published unit
+BASE_UNITS = {
+    UnitOfElectricPotential.VOLT: ("volts", 1),
+    UnitOfElectricCurrent.MILLIAMPERE: ("amperes", 1e-3),
+    UnitOfPower.WATT: ("watts", 1),
+    UnitOfTime.MINUTES: ("seconds", 60),
+}
+CELL = {field.key: field.cell for field in REGISTERS if field.cell is not None}
+
+
+def _channel_metric(key: str) -> tuple[str, float, int | None]:
+    """Return the metric name, factor from the raw value and cell of a channel.
+
+    The cells share one metric, told apart by a cell label.
+    """
+    suffix, factor = BASE_UNITS[UNITS[key]]
+    cell = CELL.get(key)
+    name = key.replace(str(cell), "", 1) if cell is not None else key
+    return f"{name}_{suffix}", factor / SCALE.get(key, 1), cell
+
+
+def _words(name: str) -> str:
+    """Return a metric name without its unit, in words."""
+    return name.rpartition("_")[0].replace("_", " ")
+
+
+def _window(name: str) -> str:
+    """Return the window statistics metric name of a channel metric."""
+    stem, _, unit = name.rpartition("_")
+    return f"{stem}_window_{unit}"
+
+
+# Buffered channel: metric name, factor from the raw register value to the
+# base unit and cell number, if any
+CHANNEL_METRICS = {key: _channel_metric(key) for key in CHANNELS}
+WINDOW_METRICS = {key: _window(name) for key, (name, _, _) in CHANNEL_METRICS.items()}
+ENERGY_DIRECTIONS = tuple(key.removeprefix("energy_") for key in ENERGY_KEYS)
+
+HELP = {
+    "up": ("gauge", "Whether the last update read the HAT."),
+    **{
+        metric: kind_text
+        for name, _, _ in CHANNEL_METRICS.values()
+        for metric, kind_text in (
+            (name, ("gauge", f"Latest sample of the {_words(name)}.")),
+            (
+                _window(name),
+                ("gauge", f"The {_words(name)} over the last update window."),
+            ),
+        )
+    },
+    "state_of_charge_percent": ("gauge", "Battery state of charge."),
+    "online": ("gauge", "Whether the charger input is powered."),
+    "charging": ("gauge", "Whether the battery is charging."),
+    "fast_charging": ("gauge", "Whether the battery is fast charging."),
+    "energy_watt_hours_total": ("counter", "Energy into and out of the battery."),
+    "register_age_seconds": ("gauge", "Time since each register group was read."),
+    "bus_transaction_seconds": ("histogram", "I2C transaction latency."),
+    "bus_errors_total": ("counter", "Failed I2C transactions."),
+    "bus_retries_total": ("counter", "Retried register group reads."),
+    "bus_reopens_total": ("counter", "Times the I2C bus was reopened."),
+    "decode_seconds": ("histogram", "Time to decode a poll and aggregate buffers."),
+    "state_writes_total": ("counter", "State writes caused by updates."),
+    "updates_total": ("counter", "Coordinator updates."),
+}
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram(
+    samples: dict[str, list[str]], name: str, labels: str, histogram: Histogram
+) -> None:
+    """Add a millisecond histogram, in seconds and with cumulative buckets."""
+    lines = samples[name]
+    seen = 0
+    for bound, count in zip(BUCKETS, histogram.buckets):
+        seen += count
+        le = "+Inf" if bound == inf else repr(bound / 1000)
+        lines.append(f'{PREFIX}_{name}_bucket{{{labels},le="{le}"}} {seen}')
+    lines.append(f"{PREFIX}_{name}_sum{{{labels}}} {histogram.total / 1000}")
+    lines.append(f"{PREFIX}_{name}_count{{{labels}}} {histogram.count}")
+
+
+def _collect(samples: dict[str, list[str]], coordinator: UpsHatECoordinator) -> None:
+    """Add the samples of one HAT, straight from its buffers and metrics."""
+    device = f'unique_id="{_label(coordinator.id_prefix)}"'
+    row, registers, energy, window = coordinator.telemetry()
+    stats = ()
+    if window is not None:
+        stats = (
+            ("median", window.percentiles[0]),
+            ("mean", window.mean),
+            ("min", window.minimum),
+            ("max", window.maximum),
+        )
+
+    samples["up"].append(
+        f"{PREFIX}_up{{{device}}} {int(coordinator.last_update_success)}"
+    )
+    for column, key in enumerate(CHANNELS):
+        name, factor, cell = CHANNEL_METRICS[key]
+        labels = device
+        if cell is not None:
+            if cell > coordinator.cells:
+                continue
+            labels += f',cell="{cell}"'
+        samples[name].append(f"{PREFIX}_{name}{{{labels}}} {row[column] * factor}")
+        name = WINDOW_METRICS[key]
+        for stat, values in stats:
+            samples[name].append(
+                f'{PREFIX}_{name}{{{labels},stat="{stat}"}} {values[column] * factor}'
+            )
+    samples["state_of_charge_percent"].append(
+        f"{PREFIX}_state_of_charge_percent{{{device}}} {registers[FIELD['soc']]}"
+    )
+    status = registers[FIELD["status"]]
+    for name, bit in (("online", 0x20), ("fast_charging", 0x40), ("charging", 0x80)):
+        samples[name].append(f"{PREFIX}_{name}{{{device}}} {int(bool(status & bit))}")
+    for direction, value in zip(ENERGY_DIRECTIONS, energy):
+        samples["energy_watt_hours_total"].append(
+            f'{PREFIX}_energy_watt_hours_total{{{device},direction="{direction}"}}'
+            f" {value}"
+        )
+    for group, age in coordinator.register_ages().items():
+        if age is not None:
+            samples["register_age_seconds"].append(
+                f'{PREFIX}_register_age_seconds{{{device},group="{group}"}} {age}'
+            )
+
+    metrics = coordinator.metrics
+    for (register, length), histogram in sorted(metrics.latency.items()):
+        _histogram(
+            samples,
+            "bus_transaction_seconds",
+            f'{device},register="{register:#04x}",length="{length}"',
+            histogram,
+        )
+    for name, counts in (
+        ("bus_errors_total", metrics.errors),
+        ("bus_retries_total", metrics.retries),
+    ):
+        for register, count in sorted(counts.items()):
+            samples[name].append(
+                f'{PREFIX}_{name}{{{device},register="{register:#04x}"}} {count}'
+            )
+    samples["bus_reopens_total"].append(
+        f"{PREFIX}_bus_reopens_total{{{device}}} {coordinator.bus_reopens}"
+    )
+    _histogram(samples, "decode_seconds", device, metrics.decode)
+    samples["state_writes_total"].append(
+        f"{PREFIX}_state_writes_total{{{device}}} {metrics.state_writes_total}"
+    )
+    samples["updates_total"].append(
+        f"{PREFIX}_updates_total{{{device}}} {metrics.updates}"
+    )
+
+
+def render(coordinators: list[UpsHatECoordinator]) -> str:
+    """Return the metrics of the HATs in the Prometheus text format."""
+    samples: dict[str, list[str]] = {name: [] for name in HELP}
+    for coordinator in coordinators:
+        _collect(samples, coordinator)
+
+    lines = []
+    for name, (kind, text) in HELP.items():
+        if not samples[name]:
+            continue
+        lines.append(f"# HELP {PREFIX}_{name} {text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+        lines.extend(samples[name])
+    return "\n".join(lines) + "\n"
+
+
+class OpenMetricsView(HomeAssistantView):
+    """Serve the metrics of the HATs that enable the endpoint.
+
+    Everything is read from memory on the event loop, without bus
+    traffic, so scraping every few seconds costs next to nothing.
+    Requests need a (long-lived) access token, like the REST API.
+    """
+
+    url = f"/api/{DOMAIN}/metrics"
+    name = f"api:{DOMAIN}:metrics"
+    requires_auth = True
+
+    def __init__(self, coordinators: list[UpsHatECoordinator]) -> None:
+        """Initialize the view."""
+        self._coordinators = coordinators
+
+    async def get(self, request: web.Request) -> web.Response:
+        """Return the metrics."""
+        return web.Response(
+            body=render(self._coordinators),
+            status=HTTPStatus.OK,
+            headers={"Content-Type": CONTENT_TYPE},
+        )
@@ -0,0 +1,117 @@
+"""UPS Hat E learned discharge curve."""
+
+from __future__ import annotations
+
+from math import sqrt
+from typing import Any, NamedTuple
+
+# Width of one SoC bin of the curve, in percent
+BIN_WIDTH = 10
+BINS = 100 // BIN_WIDTH
+
+# Observed SoC steps needed before the curve is trusted
+MIN_OBSERVATIONS = 5
+
+
+class Prediction(NamedTuple):
+    """Time to empty, in minutes, with lower and upper bounds."""
+
+    minutes: float
+    lower: float
+    upper: float
+
+
+class DischargeModel:
+    """Discharge curve learned from real outages.
+
+    For each SoC bin the model keeps the running mean and variance
+    (Welford) of the energy, in Wh, drawn from the battery per percent
+    of SoC. The time to empty is the energy left under the curve divided
+    by the present discharge power, so the curve does not depend on the
+    load it was learned under. Updating and predicting are O(BINS).
+    """
+
+    def __init__(self, stored: dict[str, Any] | None = None) -> None:
+        """Initialize the model, optionally from its stored form."""
+        self._count = [0] * BINS
+        self._mean = [0.0] * BINS
+        self._m2 = [0.0] * BINS
+        if stored:
+            self._count = list(stored["count"])
+            self._mean = list(stored["mean"])
+            self._m2 = list(stored["m2"])
+        # SoC and discharged energy at the anchor, and whether the anchor is
+        # an observed SoC step rather than the SoC the discharge started in
+        self._anchor: tuple[int, float, bool] | None = None
+
+    @property
+    def observations(self) -> int:
+        """Return the number of observed SoC steps."""
+        return sum(self._count)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the stored form of the model."""
+        return {"count": self._count, "mean": self._mean, "m2": self._m2}
+
+    def _update(self, percent: int, wh: float) -> None:
+        index = min(max(percent - 1, 0) // BIN_WIDTH, BINS - 1)
+        self._count[index] += 1
+        delta = wh - self._mean[index]
+        self._mean[index] += delta / self._count[index]
+        self._m2[index] += delta * (wh - self._mean[index])
+
+    def observe(self, soc: int, discharged_wh: float, discharging: bool) -> bool:
+        """Feed one poll; return True if the curve was updated.
+
+        Energy drawn between two SoC steps is spread evenly over the
+        percents crossed. The step that ends the first percent after an
+        anchor is only used as the next anchor: the discharge started
+        partway through that percent, so it drew less than a full one.
+        Any interruption of the discharge, or a SoC that goes up,
+        restarts the measurement.
+        """
+        if not discharging:
+            self._anchor = None
+            return False
+        if self._anchor is None or soc > self._anchor[0]:
+            self._anchor = (soc, discharged_wh, False)
+            return False
+
+        anchor_soc, anchor_wh, stepped = self._anchor
+        if soc == anchor_soc:
+            return False
+
+        self._anchor = (soc, discharged_wh, True)
+        if not stepped:
+            return False
+        per_percent = (discharged_wh - anchor_wh) / (anchor_soc - soc)
+        for percent in range(soc + 1, anchor_soc + 1):
+            self._update(percent, per_percent)
+        return True
+
+    def predict(self, soc: float, power: float) -> Prediction | None:
+        """Return the time to empty at the given SoC and discharge power (W).
+
+        Bins never observed use the mean of the observed ones. The bounds
+        add one standard deviation per percent left, i.e. they assume the
+        error is fully correlated across the curve.
+        """
+        if power <= 0 or self.observations < MIN_OBSERVATIONS:
+            return None
+
+        learned = [index for index in range(BINS) if self._count[index]]
+        fallback = sum(self._mean[index] for index in learned) / len(learned)
+        energy = spread = 0.0
+        for percent in range(1, int(soc) + 1):
+            index = min((percent - 1) // BIN_WIDTH, BINS - 1)
+            count = self._count[index]
+            energy += self._mean[index] if count else fallback
+            if count > 1:
+                spread += sqrt(self._m2[index] / (count - 1))
+
+        minutes = 60 / power
+        return Prediction(
+            energy * minutes,
+            max(energy - spread, 0.0) * minutes,
+            (energy + spread) * minutes,
+        )
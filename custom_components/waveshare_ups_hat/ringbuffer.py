@@ -0,0 +1,96 @@
+"""UPS Hat E multi-channel ring buffer."""
+
+from __future__ import annotations
+
+from array import array
+from collections.abc import Sequence
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy ships with Home Assistant
+    np = None
+
+
+class WindowStats(NamedTuple):
+    """Per-channel statistics over the buffered window."""
+
+    count: int
+    mean: list[float]
+    minimum: list[float]
+    maximum: list[float]
+    # One per-channel list for each requested percentile
+    percentiles: list[list[float]]
+
+
+class RingBuffer:
+    """Fixed-size ring buffer of integer rows, one column per channel.
+
+    Backed by a single NumPy int32 block when NumPy is available, otherwise
+    by a flat array('i'). Memory is allocated once and never grows.
+    """
+
+    def __init__(self, channels: int, size: int) -> None:
+        """Initialize the ring buffer."""
+        self.channels = channels
+        self.size = size
+        self._pos = 0
+        self._count = 0
+        if np is not None:
+            self._data = np.zeros((size, channels), dtype=np.int32)
+        else:
+            self._data = array("i", bytes(4 * size * channels))
+
+    def __len__(self) -> int:
+        """Return the number of buffered rows."""
+        return self._count
+
+    def append(self, row: Sequence[int]) -> None:
+        """Append one row, overwriting the oldest when full."""
+        if np is not None:
+            self._data[self._pos] = row
+        else:
+            start = self._pos * self.channels
+            self._data[start : start + self.channels] = array("i", row)
+        self._pos = (self._pos + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def clear(self) -> None:
+        """Forget all buffered rows."""
+        self._pos = 0
+        self._count = 0
+
+    def stats(self, percentiles: Sequence[float] = (50,)) -> WindowStats:
+        """Return mean, min, max and percentiles of every channel.
+
+        Row order does not matter for these statistics, so the filled part
+        of the buffer is used as is without unrolling the ring.
+        """
+        n = self._count
+        if n == 0:
+            raise ValueError("RingBuffer is empty")
+
+        if np is not None:
+            view = self._data[:n]
+            return WindowStats(
+                n,
+                view.mean(axis=0).tolist(),
+                view.min(axis=0).tolist(),
+                view.max(axis=0).tolist(),
+                np.percentile(view, percentiles, axis=0).tolist(),
+            )
+
+        mean, minimum, maximum = [], [], []
+        result: list[list[float]] = [[] for _ in percentiles]
+        for channel in range(self.channels):
+            column = sorted(self._data[channel : n * self.channels : self.channels])
+            mean.append(sum(column) / n)
+            minimum.append(column[0])
+            maximum.append(column[-1])
+            for values, q in zip(result, percentiles):
+                # Linear interpolation, as numpy.percentile does by default
+                pos = q / 100 * (n - 1)
+                low = int(pos)
+                high = min(low + 1, n - 1)
+                values.append(column[low] + (column[high] - column[low]) * (pos - low))
+        return WindowStats(n, mean, minimum, maximum, result)
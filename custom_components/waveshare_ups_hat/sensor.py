@@ -1,26 +1,141 @@
 """UPS Hat E sensors."""
 
+from collections.abc import Callable
+from dataclasses import dataclass
 import logging
 
 from homeassistant import core
-from homeassistant.components.sensor import SensorEntity
-from homeassistant.components.sensor.const import SensorDeviceClass, SensorStateClass
-from homeassistant.const import (
-    PERCENTAGE,
-    UnitOfElectricCurrent,
-    UnitOfElectricPotential,
-    UnitOfEnergy,
-    UnitOfPower,
-    UnitOfTime,
+from homeassistant.components.sensor import (
+    SensorEntity,
+    SensorEntityDescription,
 )
+from homeassistant.components.sensor.const import SensorDeviceClass, SensorStateClass
+from homeassistant.const import EntityCategory, UnitOfEnergy, UnitOfTime
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 
+from .const import REGISTERS, RegisterField
+from .coordinator import GROUP_NAMES, UpsHatECoordinator
 from .entity import UpsHatEEntity
 
 _LOGGER = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True, kw_only=True)
+class UpsHatESensorEntityDescription(SensorEntityDescription):
+    """Describes a UPS Hat E sensor.
+
+    The name doubles as the unique_id suffix, so it must not change.
+    """
+
+    exists_fn: Callable[[UpsHatECoordinator], bool] = lambda _: True
+
+
+def _register(field: RegisterField) -> UpsHatESensorEntityDescription:
+    """Describe the sensor of a register field."""
+    return UpsHatESensorEntityDescription(
+        key=field.key,
+        name=field.name,
+        native_unit_of_measurement=field.unit,
+        device_class=field.device_class,
+        suggested_display_precision=field.display_precision,
+        exists_fn=lambda coordinator: field.cell is None
+        or coordinator.cells >= field.cell,
+    )
+
+
+SENSORS: tuple[UpsHatESensorEntityDescription, ...] = (
+    *(_register(field) for field in REGISTERS if field.name is not None),
+    UpsHatESensorEntityDescription(
+        key="remaining_battery_capacity",
+        name="Remaining Capacity",
+        native_unit_of_measurement=UnitOfEnergy.WATT_HOUR,
+        device_class=SensorDeviceClass.ENERGY_STORAGE,
+        suggested_display_precision=0,
+    ),
+    UpsHatESensorEntityDescription(
+        key="remaining_time",
+        name="Remaining Time",
+        native_unit_of_measurement=UnitOfTime.MINUTES,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.TOTAL,
+        suggested_display_precision=0,
+    ),
+    UpsHatESensorEntityDescription(
+        key="predicted_time_to_empty",
+        name="Predicted Time To Empty",
+        native_unit_of_measurement=UnitOfTime.MINUTES,
+        device_class=SensorDeviceClass.DURATION,
+        suggested_display_precision=0,
+    ),
+    UpsHatESensorEntityDescription(
+        key="energy_charged",
+        name="Battery Energy Charged",
+        native_unit_of_measurement=UnitOfEnergy.WATT_HOUR,
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        suggested_display_precision=2,
+    ),
+    UpsHatESensorEntityDescription(
+        key="energy_discharged",
+        name="Battery Energy Discharged",
+        native_unit_of_measurement=UnitOfEnergy.WATT_HOUR,
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        suggested_display_precision=2,
+    ),
+    UpsHatESensorEntityDescription(
+        key="energy_input",
+        name="Charger Energy",
+        native_unit_of_measurement=UnitOfEnergy.WATT_HOUR,
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        suggested_display_precision=2,
+    ),
+)
+
+# Health of the I2C path, read from the bus metrics rather than the device
+DIAGNOSTIC_SENSORS: tuple[UpsHatESensorEntityDescription, ...] = (
+    UpsHatESensorEntityDescription(
+        key="bus_latency",
+        name="Bus Latency",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    UpsHatESensorEntityDescription(
+        key="bus_errors",
+        name="Bus Errors",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+    UpsHatESensorEntityDescription(
+        key="decode_time",
+        name="Decode Time",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        suggested_display_precision=3,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    UpsHatESensorEntityDescription(
+        key="state_writes",
+        name="State Writes Per Update",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    UpsHatESensorEntityDescription(
+        key="register_age",
+        name="Register Age",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+)
+
+
 async def async_setup_platform(
     hass: core.HomeAssistant,
     config: ConfigType,
@@ -34,223 +149,54 @@ async def async_setup_platform(
 
     coordinator = discovery_info.get("coordinator")
 
-    sensors = [
-        ChargerVoltageSensor(coordinator),
-        ChargerCurrentSensor(coordinator),
-        ChargerPowerSensor(coordinator),
-        BatteryVoltageSensor(coordinator),
-        BatteryCurrentSensor(coordinator),
-        SocSensor(coordinator),
-        RemainingCapacitySensor(coordinator),
-        RemainingTimeSensor(coordinator),
-        Cell1VoltageSensor(coordinator),
-        Cell2VoltageSensor(coordinator),
-        Cell3VoltageSensor(coordinator),
-        Cell4VoltageSensor(coordinator),
-    ]
-    async_add_entities(sensors)
-
-
-class ChargerVoltageSensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the charger voltage of the UPS Hat E."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the charger voltage sensor."""
-        super().__init__(coordinator)
-        self._name = "Charger Voltage"
-        self._attr_native_unit_of_measurement = UnitOfElectricPotential.VOLT
-        self._attr_device_class = SensorDeviceClass.VOLTAGE
-        self._attr_suggested_display_precision = 1
+    async_add_entities(
+        UpsHatESensor(coordinator, description)
+        for description in SENSORS
+        if description.exists_fn(coordinator)
+        and description.key not in coordinator.external_statistics
+    )
+    async_add_entities(
+        UpsHatEDiagnosticSensor(coordinator, description)
+        for description in DIAGNOSTIC_SENSORS
+    )
+
+
+class UpsHatESensor(UpsHatEEntity, SensorEntity):
+    """Sensor reporting one coordinator value of the UPS Hat E."""
+
+    entity_description: UpsHatESensorEntityDescription
+    # Window statistics change on every poll; keep them out of the database
+    _unrecorded_attributes = frozenset({"mean", "min", "max", "samples"})
+
+    def __init__(
+        self,
+        coordinator: UpsHatECoordinator,
+        description: UpsHatESensorEntityDescription,
+    ) -> None:
+        """Initialize the sensor."""
+        self.entity_description = description
+        super().__init__(coordinator, description.name, description.key)
 
     @property
     def native_value(self):
-        """Return the voltage value reported by the UPS."""
-        return self._coordinator.data["charger_voltage"]
-
-
-class ChargerCurrentSensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the charger current of the UPS Hat E."""
+        """Return the value reported by the UPS."""
+        return self._value()
 
-    def __init__(self, coordinator) -> None:
-        """Initialize the charger current sensor."""
-        super().__init__(coordinator)
-        self._name = "Charger Current"
-        self._attr_native_unit_of_measurement = UnitOfElectricCurrent.MILLIAMPERE
-        self._attr_device_class = SensorDeviceClass.CURRENT
-        self._attr_suggested_display_precision = 0
 
-    @property
-    def native_value(self):
-        """Return the current value reported by the UPS."""
-        return self._coordinator.data["charger_current"]
+class UpsHatEDiagnosticSensor(UpsHatESensor):
+    """Sensor reporting one diagnostic value of the I2C path.
 
+    Stays available while the device does not answer, which is when
+    these values matter most.
+    """
 
-class ChargerPowerSensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the power of the UPS Hat E."""
+    _unrecorded_attributes = frozenset({"p50", "p99", "max", *GROUP_NAMES})
 
-    def __init__(self, coordinator) -> None:
-        """Initialize the charger power sensor."""
-        super().__init__(coordinator)
-        self._name = "Charger Power"
-        self._attr_native_unit_of_measurement = UnitOfPower.WATT
-        self._attr_device_class = SensorDeviceClass.POWER
-        self._attr_suggested_display_precision = 1
+    def _value(self):
+        """Return the diagnostic value of the key."""
+        return self._coordinator.diagnostics.get(self._key)
 
     @property
-    def native_value(self):
-        """Return the power value reported by the UPS."""
-        return self._coordinator.data["charger_power"]
-
-
-class BatteryVoltageSensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the voltage of the UPS Hat E."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the battery voltage sensor."""
-        super().__init__(coordinator)
-        self._name = "Battery Voltage"
-        self._attr_native_unit_of_measurement = UnitOfElectricPotential.VOLT
-        self._attr_device_class = SensorDeviceClass.VOLTAGE
-        self._attr_suggested_display_precision = 1
-
-    @property
-    def native_value(self):
-        """Return the voltage value reported by the UPS."""
-        return self._coordinator.data["battery_voltage"]
-
-
-class BatteryCurrentSensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the current of the UPS Hat E."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the battery current sensor."""
-        super().__init__(coordinator)
-        self._name = "Battery Current"
-        self._attr_native_unit_of_measurement = UnitOfElectricCurrent.MILLIAMPERE
-        self._attr_device_class = SensorDeviceClass.CURRENT
-        self._attr_suggested_display_precision = 0
-
-    @property
-    def native_value(self):
-        """Return the current value reported by the UPS."""
-        return self._coordinator.data["battery_current"]
-
-
-class SocSensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the SoC of the UPS Hat E."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the SoC sensor."""
-        super().__init__(coordinator)
-        self._name = "SoC"
-        self._attr_native_unit_of_measurement = PERCENTAGE
-        self._attr_device_class = SensorDeviceClass.BATTERY
-        self._attr_suggested_display_precision = 1
-
-    @property
-    def native_value(self):
-        """Return the SoC value reported by the UPS."""
-        return self._coordinator.data["soc"]
-
-
-class RemainingCapacitySensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the remaining capacity of the UPS Hat E."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the capacity sensor."""
-        super().__init__(coordinator)
-        self._name = "Remaining Capacity"
-        self._attr_native_unit_of_measurement = UnitOfEnergy.WATT_HOUR
-        self._attr_device_class = SensorDeviceClass.ENERGY_STORAGE
-        self._attr_suggested_display_precision = 0
-
-    @property
-    def native_value(self):
-        """Return the capacity value reported by the UPS."""
-        return self._coordinator.data["remaining_battery_capacity"]
-
-
-class RemainingTimeSensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the remianing time of the UPS Hat E."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the remaining time sensor."""
-        super().__init__(coordinator)
-        self._name = "Remaining Time"
-        self._attr_native_unit_of_measurement = UnitOfTime.MINUTES
-        self._attr_device_class = SensorDeviceClass.DURATION
-        self._attr_state_class = SensorStateClass.TOTAL
-        self._attr_suggested_display_precision = 0
-
-    @property
-    def native_value(self):
-        """Return the remaining reported by the UPS."""
-        return self._coordinator.data["remaining_time"]
-
-
-class Cell1VoltageSensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the charger voltage of the UPS Hat E."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the cell 1 voltage sensor."""
-        super().__init__(coordinator)
-        self._name = "Cell1 Voltage"
-        self._attr_native_unit_of_measurement = UnitOfElectricPotential.VOLT
-        self._attr_device_class = SensorDeviceClass.VOLTAGE
-        self._attr_suggested_display_precision = 1
-
-    @property
-    def native_value(self):
-        """Return the voltage value reported by the UPS."""
-        return self._coordinator.data["cell1_voltage"]
-
-
-class Cell2VoltageSensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the charger voltage of the UPS Hat E."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the cell 2 voltage sensor."""
-        super().__init__(coordinator)
-        self._name = "Cell2 Voltage"
-        self._attr_native_unit_of_measurement = UnitOfElectricPotential.VOLT
-        self._attr_device_class = SensorDeviceClass.VOLTAGE
-        self._attr_suggested_display_precision = 1
-
-    @property
-    def native_value(self):
-        """Return the voltage value reported by the UPS."""
-        return self._coordinator.data["cell2_voltage"]
-
-
-class Cell3VoltageSensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the charger voltage of the UPS Hat E."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the cell 3 voltage sensor."""
-        super().__init__(coordinator)
-        self._name = "Cell3 Voltage"
-        self._attr_native_unit_of_measurement = UnitOfElectricPotential.VOLT
-        self._attr_device_class = SensorDeviceClass.VOLTAGE
-        self._attr_suggested_display_precision = 1
-
-    @property
-    def native_value(self):
-        """Return the voltage value reported by the UPS."""
-        return self._coordinator.data["cell3_voltage"]
-
-
-class Cell4VoltageSensor(UpsHatEEntity, SensorEntity):
-    """Sensor for reporting the charger voltage of the UPS Hat E."""
-
-    def __init__(self, coordinator) -> None:
-        """Initialize the cell 4 voltage sensor."""
-        super().__init__(coordinator)
-        self._name = "Cell4 Voltage"
-        self._attr_native_unit_of_measurement = UnitOfElectricPotential.VOLT
-        self._attr_device_class = SensorDeviceClass.VOLTAGE
-        self._attr_suggested_display_precision = 1
-
-    @property
-    def native_value(self):
-        """Return the voltage value reported by the UPS."""
-        return self._coordinator.data["cell4_voltage"]
+    def available(self) -> bool:
+        """Return True; the metrics do not depend on the device."""
+        return True
@@ -0,0 +1,186 @@
+"""UPS Hat E shutdown orchestration."""
+
+from __future__ import annotations
+
+from collections.abc import Awaitable, Callable
+import logging
+from time import monotonic, time
+from typing import Any
+
+from homeassistant.const import (
+    ATTR_DOMAIN,
+    ATTR_SERVICE,
+    EVENT_CALL_SERVICE,
+    EVENT_HOMEASSISTANT_CLOSE,
+    EVENT_HOMEASSISTANT_STOP,
+    RESTART_EXIT_CODE,
+)
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+
+from .bus import CommandResult
+from .const import DOMAIN, STORAGE_VERSION
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds from the shutdown command to the HAT cutting power, as documented
+POWER_OFF_DELAY = 30
+# Seconds kept in hand when racing an empty battery
+SAFETY_MARGIN = 30
+# Home Assistant stop durations remembered; the longest one is planned for
+STOP_DURATIONS = 10
+
+
+class ShutdownOrchestrator:
+    """Sends the shutdown command as late as is safe when Home Assistant stops.
+
+    The command goes out when Home Assistant closes, its last moment, so
+    that the HAT cuts power as long as possible after the host started
+    shutting down; nothing is gained by waiting longer, as that delays
+    the host just as much. Only when the battery would not last through
+    the expected stop duration plus the power-off delay is the command
+    sent earlier, during the stop.
+
+    A restart never sends it. Without the Supervisor, a restart exits with
+    RESTART_EXIT_CODE and every other stop is taken for a shutdown. Under
+    the Supervisor every stop, restarts included, exits with 0, so only a
+    stop after a hassio.host_shutdown call sends the command; a host
+    shutdown from the Supervisor itself goes unnoticed.
+
+    The stop duration of every shutdown is measured and kept across
+    restarts.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        id_prefix: str,
+        send: Callable[[], Awaitable[CommandResult | None]],
+        runtime_left: Callable[[], float | None],
+    ) -> None:
+        """Initialize the orchestrator.
+
+        send sends the shutdown command, returning None when it is not
+        sent (e.g. on mains). runtime_left returns the seconds the battery
+        is expected to last, or None when not discharging.
+        """
+        self._hass = hass
+        self._send = send
+        self._runtime_left = runtime_left
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{id_prefix}.shutdown")
+        self._stop_durations: list[float] = []
+        # Wall time of the last confirmed command
+        self._command_at: float | None = None
+
+        self._host_shutdown = False
+        # Time base of the stop durations
+        self.clock: Callable[[], float] = monotonic
+        self._stopping_at: float | None = None
+        self._sent = False
+        self._unsub_early: Callable[[], None] | None = None
+
+    @property
+    def expected_stop(self) -> float:
+        """Return the seconds Home Assistant is expected to take to stop."""
+        return max(self._stop_durations, default=0.0)
+
+    async def async_setup(self) -> None:
+        """Load the timings and follow the Home Assistant stop."""
+        if (stored := await self._store.async_load()) is not None:
+            self._stop_durations = stored.get("stop_durations", [])
+            self._command_at = stored.get("command_at")
+
+        self._hass.bus.async_listen(EVENT_CALL_SERVICE, self._async_host_shutdown)
+        self._hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self._async_stop)
+        self._hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, self._async_close)
+
+    def _as_stored(self) -> dict[str, Any]:
+        return {
+            "stop_durations": self._stop_durations,
+            "command_at": self._command_at,
+        }
+
+    @callback
+    def _async_host_shutdown(self, event: Event) -> None:
+        """Remember a service call asking the Supervisor to shut the host down."""
+        if (
+            event.data.get(ATTR_DOMAIN) == "hassio"
+            and event.data.get(ATTR_SERVICE) == "host_shutdown"
+        ):
+            self._host_shutdown = True
+
+    def _shutting_down(self) -> bool:
+        """Return whether Home Assistant stops because the host shuts down."""
+        if self._hass.exit_code == RESTART_EXIT_CODE:
+            return False
+        if "hassio" in self._hass.config.components:
+            # Restarts and updates exit with 0 as well under the Supervisor
+            return self._host_shutdown
+        return True
+
+    @callback
+    def _async_stop(self, event: Event) -> None:
+        """Plan the command when Home Assistant starts stopping."""
+        if not self._shutting_down():
+            _LOGGER.debug("Not a host shutdown, the UPS stays on")
+            return
+        self._stopping_at = self.clock()
+        # A command sent earlier, e.g. from the button, may not have cut power
+        self._sent = False
+
+        if (runtime := self._runtime_left()) is None:
+            return
+        # Latest moment the command can go out for the HAT to cut power
+        # before the battery runs out
+        latest = runtime - POWER_OFF_DELAY - SAFETY_MARGIN
+        if latest >= self.expected_stop:
+            return
+        _LOGGER.warning(
+            "Battery left for %.0f s, sending the shutdown command in %.0f s"
+            " rather than after the expected %.0f s stop",
+            runtime,
+            max(latest, 0),
+            self.expected_stop,
+        )
+        self._unsub_early = async_call_later(
+            self._hass, max(latest, 0), self._async_send_early
+        )
+
+    async def _async_send_early(self, _now: Any) -> None:
+        self._unsub_early = None
+        await self._async_send()
+
+    async def _async_close(self, event: Event) -> None:
+        """Send the command, if still due, as Home Assistant closes."""
+        if self._unsub_early is not None:
+            self._unsub_early()
+            self._unsub_early = None
+        if self._stopping_at is None:
+            return
+        duration = self.clock() - self._stopping_at
+        _LOGGER.debug("Home Assistant took %.1f s to stop", duration)
+        self._stop_durations = [*self._stop_durations, round(duration, 1)][
+            -STOP_DURATIONS:
+        ]
+        await self._async_send()
+        await self._store.async_save(self._as_stored())
+
+    async def _async_send(self) -> None:
+        # A confirmed command reports back through async_command_sent
+        if not self._sent:
+            await self._send()
+
+    @callback
+    def async_command_sent(self) -> None:
+        """Record a confirmed command."""
+        self._sent = True
+        self._command_at = time()
+        self._store.async_delay_save(self._as_stored)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the timings for the diagnostics dump."""
+        return {
+            "stop_durations": self._stop_durations,
+            "last_command_at": self._command_at,
+        }
@@ -0,0 +1,170 @@
+"""Benchmark the UPS Hat E hot path against the emulated HAT.
+
+Boots a throwaway Home Assistant instance with the integration on the
+emulator backend and reports poll latency, event loop block time,
+allocations per update, state writes per minute and executor jobs per
+update (all HATs of the bus together).
+
+    python scripts/benchmark.py --duration 60 --scenario outage --speed 60
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+from pathlib import Path
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from homeassistant import bootstrap, runner
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.helpers import entity_registry as er
+
+ROOT = Path(__file__).resolve().parent.parent
+DOMAIN = "waveshare_ups_hat"
+
+# Interval of the event loop lag probe, in seconds
+PROBE_INTERVAL = 0.001
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(round(q / 100 * (len(ordered) - 1)), len(ordered) - 1)]
+
+
+def _write_config(config_dir: str, args: argparse.Namespace) -> None:
+    os.symlink(ROOT / "custom_components", Path(config_dir, "custom_components"))
+    lines = [f"{DOMAIN}:"]
+    for device in range(args.devices):
+        lines += [
+            f"  - addr: {0x2D + device:#x}",
+            f"    unique_id: ups_hat_e_{device}",
+            f"    name: UPS HAT E {device}",
+            f"    scan_interval: {args.scan_interval}",
+            f"    oversampling_rate: {args.oversampling_rate}",
+            f"    history_size: {args.history_size}",
+            "    emulator:",
+            f"      scenario: {args.scenario}",
+            f"      speed: {args.speed}",
+            f"      latency: {args.latency}",
+            f"      error_rate: {args.error_rate}",
+        ]
+    Path(config_dir, "configuration.yaml").write_text("\n".join(lines) + "\n")
+
+
+async def _probe(lags: list[float]) -> None:
+    """Record by how much every short sleep overshoots: time the loop was busy."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(loop.time() - start - PROBE_INTERVAL, 0.0))
+
+
+async def _run(args: argparse.Namespace) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as config_dir:
+        _write_config(config_dir, args)
+        hass = await bootstrap.async_setup_hass(
+            runner.RuntimeConfig(config_dir=config_dir, skip_pip=True)
+        )
+        if hass is None or DOMAIN not in hass.config.components:
+            raise SystemExit("Home Assistant failed to set up the integration")
+        await hass.async_start()
+        coordinator = next(iter(hass.data[DOMAIN].values()))
+
+        latencies: list[float] = []
+        allocated: list[int] = []
+        update = coordinator._async_update_data
+
+        async def _timed_update():
+            if args.allocations:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try:
+                return await update()
+            finally:
+                latencies.append(time.perf_counter() - start)
+                if args.allocations:
+                    allocated.append(tracemalloc.get_traced_memory()[1] - before)
+
+        coordinator._async_update_data = _timed_update
+
+        entity_ids = {
+            entry.entity_id
+            for entry in er.async_get(hass).entities.values()
+            if entry.platform == DOMAIN
+        }
+        writes = 0
+
+        def _count_write(event) -> None:
+            nonlocal writes
+            if event.data["entity_id"] in entity_ids:
+                writes += 1
+
+        hass.bus.async_listen(EVENT_STATE_CHANGED, _count_write)
+        lags: list[float] = []
+        probe = hass.async_create_background_task(_probe(lags), "benchmark probe")
+        if args.allocations:
+            tracemalloc.start()
+
+        await asyncio.sleep(args.duration)
+
+        probe.cancel()
+        tracemalloc.stop()
+        bus = coordinator._bus
+        await hass.async_stop()
+
+    return {
+        "updates": len(latencies),
+        "poll_latency_p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "poll_latency_p99_ms": _percentile(latencies, 99) * 1000,
+        "poll_latency_max_ms": max(latencies, default=0) * 1000,
+        "bus_time_max_ms": bus.bus_time_max * 1000,
+        "loop_submit_max_ms": bus.loop_time_max * 1000,
+        "loop_lag_p99_ms": _percentile(lags, 99) * 1000,
+        "loop_lag_max_ms": max(lags, default=0) * 1000,
+        "allocated_kib_per_update": (
+            statistics.mean(allocated) / 1024 if allocated else float("nan")
+        ),
+        "state_writes_per_minute": writes / args.duration * 60,
+        "bus_jobs_per_update": bus.jobs / len(latencies) if latencies else 0,
+    }
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--scan-interval", type=int, default=1)
+    parser.add_argument("--oversampling-rate", type=float, default=10)
+    parser.add_argument("--history-size", type=int, default=0)
+    parser.add_argument("--devices", type=int, default=1, help="HATs on the bus")
+    parser.add_argument("--scenario", default="outage")
+    parser.add_argument("--speed", type=float, default=60)
+    parser.add_argument("--latency", type=float, default=0.0005, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument(
+        "--allocations",
+        action="store_true",
+        help="trace allocations (slows down everything else)",
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(_run(args))
+    if args.json:
+        print(json.dumps(results))
+        return
+    for name, value in results.items():
+        print(f"{name:28} {value:10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Make the integration importable as custom_components.waveshare_ups_hat."""
+
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,181 @@
+"""Tests of the I2C worker on an emulated bus."""
+
+import asyncio
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.waveshare_ups_hat.bus import (
+    BACKOFF_MIN,
+    REOPEN_AFTER,
+    BusBackoffError,
+    UpsHatEBus,
+)
+from custom_components.waveshare_ups_hat.const import (
+    CONST_SHUTDOWN_CMD,
+    REG_CHARGING,
+    REG_REBOOT,
+)
+from custom_components.waveshare_ups_hat.emulator import EmulatedBus
+
+ADDR = 0x2D
+
+
+def _run(config_dir, devices, test):
+    """Run the coroutine function test on a bus of emulated HATs.
+
+    devices maps addresses to emulator settings. It is read on every
+    open, so a test can take a HAT off the bus before a reopen.
+    """
+
+    async def run():
+        hass = HomeAssistant(str(config_dir))
+        handles = []
+
+        def open_bus(number):
+            handles.append(EmulatedBus(number, devices))
+            return handles[-1]
+
+        bus = UpsHatEBus(hass, 1, open_bus, REG_CHARGING)
+        now = [0.0]
+        bus.clock = lambda: now[0]
+        try:
+            return await test(bus, handles, now)
+        finally:
+            await bus.async_close()
+            await hass.async_stop(force=True)
+
+    return asyncio.run(run())
+
+
+async def _read(bus, addr=ADDR) -> str:
+    """Read the status register and return how it went."""
+    try:
+        await bus.async_read_block(addr, REG_CHARGING, 1)
+    except BusBackoffError:
+        return "backoff"
+    except OSError:
+        return "error"
+    return "ok"
+
+
+def test_handle_is_reopened_with_backoff(tmp_path):
+    devices = {ADDR: {}}
+
+    async def test(bus, handles, now):
+        outcomes = [await _read(bus)]
+        # The adapter resets: nothing answers on the old handle, nor after
+        # the first reopen
+        handles[0].devices.clear()
+        devices.clear()
+        outcomes += [await _read(bus) for _ in range(REOPEN_AFTER + 1)]
+        now[0] += BACKOFF_MIN
+        outcomes.append(await _read(bus))
+        # Twice the delay after a failed reopen
+        now[0] += BACKOFF_MIN
+        outcomes.append(await _read(bus))
+        devices[ADDR] = {}
+        now[0] += BACKOFF_MIN
+        outcomes.append(await _read(bus))
+        return outcomes, len(handles), bus.reopens
+
+    outcomes, opened, reopens = _run(tmp_path, devices, test)
+
+    assert outcomes == [
+        "ok",
+        *["error"] * REOPEN_AFTER,
+        "backoff",
+        "error",
+        "backoff",
+        "ok",
+    ]
+    assert opened == 3
+    assert reopens == 1
+
+
+def test_missing_hat_does_not_fail_the_others(tmp_path):
+    async def test(bus, handles, now):
+        outcomes = []
+        for _ in range(2 * REOPEN_AFTER):
+            outcomes.append((await _read(bus, ADDR + 1), await _read(bus)))
+        return outcomes, bus.reopens
+
+    # Nothing at ADDR + 1, which is read first, on the closed handle
+    outcomes, reopens = _run(tmp_path, {ADDR: {}}, test)
+
+    assert outcomes == [("error", "ok")] * (2 * REOPEN_AFTER)
+    assert reopens == 0
+
+
+def test_write_is_confirmed_by_its_readback(tmp_path):
+    async def test(bus, handles, now):
+        return await bus.async_write_confirmed(ADDR, REG_REBOOT, 0x0F)
+
+    result = _run(tmp_path, {ADDR: {}}, test)
+
+    assert result.confirmed
+    assert result.attempts == 1
+    assert result.readback == 0x0F
+
+
+def test_write_is_retried_until_the_timeout(tmp_path):
+    async def test(bus, handles, now):
+        # The HAT keeps its status register up to date over any write
+        return await bus.async_write_confirmed(ADDR, REG_CHARGING, 0x00, timeout=0.25)
+
+    result = _run(tmp_path, {ADDR: {}}, test)
+
+    assert not result.confirmed
+    assert result.attempts > 1
+    # Still on mains, as the HAT reports it
+    assert result.readback & 0x20
+    assert result.error is None
+
+
+def test_command_is_confirmed_by_its_acknowledgement(tmp_path):
+    async def test(bus, handles, now):
+        result = await bus.async_write_confirmed(
+            ADDR, REG_REBOOT, CONST_SHUTDOWN_CMD, readback=False
+        )
+        return result, handles[0].devices[ADDR].shutdown
+
+    result, shutdown = _run(tmp_path, {ADDR: {}}, test)
+
+    assert result.confirmed
+    assert result.attempts == 1
+    assert result.readback is None
+    assert shutdown
+
+
+def test_bus_errors_fail_the_command(tmp_path):
+    async def test(bus, handles, now):
+        return await bus.async_write_confirmed(
+            ADDR + 1, REG_REBOOT, CONST_SHUTDOWN_CMD, timeout=0.25, readback=False
+        )
+
+    result = _run(tmp_path, {ADDR: {}}, test)
+
+    assert not result.confirmed
+    assert result.attempts > 1
+    assert isinstance(result.error, OSError)
+
+
+def test_urgent_command_does_not_wait_for_the_backoff(tmp_path):
+    async def test(bus, handles, now):
+        await _read(bus)
+        # The HAT drops off the bus, and is back by the time it reopens
+        handles[0].devices.clear()
+        for _ in range(REOPEN_AFTER):
+            await _read(bus)
+        plain = await bus.async_write_confirmed(
+            ADDR, REG_REBOOT, CONST_SHUTDOWN_CMD, timeout=0.25, readback=False
+        )
+        urgent = await bus.async_write_confirmed(
+            ADDR, REG_REBOOT, CONST_SHUTDOWN_CMD, readback=False, urgent=True
+        )
+        return plain, urgent, handles[-1].devices[ADDR].shutdown
+
+    plain, urgent, shutdown = _run(tmp_path, {ADDR: {}}, test)
+
+    assert isinstance(plain.error, BusBackoffError)
+    assert urgent.confirmed
+    assert shutdown
@@ -0,0 +1,88 @@
+"""Tests of the raw register capture file and its replay."""
+
+import errno
+import os
+
+import pytest
+
+from custom_components.waveshare_ups_hat.capture import (
+    HEADER,
+    RECORD,
+    CaptureWriter,
+    ReplaySMBus,
+    read_capture,
+)
+
+
+def _capture(path) -> None:
+    writer = CaptureWriter(str(path))
+    writer.open()
+    writer.write(1.0, 0x02, bytes(range(54)))
+    writer.write(2.0, 0x10, b"")
+    writer.close()
+    # Appending to an existing capture adds no second header
+    writer.open()
+    writer.write(3.0, 0x20, b"\x01\x02")
+    writer.close()
+
+
+def test_capture_round_trip(tmp_path):
+    path = tmp_path / "capture"
+    _capture(path)
+
+    assert os.path.getsize(path) == HEADER.size + 3 * RECORD.size + 54 + 2
+    assert list(read_capture(str(path))) == [
+        (1.0, 0x02, bytes(range(54))),
+        (2.0, 0x10, b""),
+        (3.0, 0x20, b"\x01\x02"),
+    ]
+
+
+def test_capture_stops_at_a_truncated_record(tmp_path):
+    path = tmp_path / "capture"
+    _capture(path)
+    with open(path, "ab") as file:
+        file.write(RECORD.pack(4.0, 0x02, 54)[:5])
+
+    assert len(list(read_capture(str(path)))) == 3
+
+
+def test_capture_rejects_other_files(tmp_path):
+    path = tmp_path / "history"
+    path.write_bytes(b"UPSH\x01\x00")
+
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
+
+
+def test_replay_serves_the_capture(tmp_path):
+    path = tmp_path / "capture"
+    _capture(path)
+    replay = ReplaySMBus(1, str(path))
+
+    assert replay.read_i2c_block_data(0x2D, 0x02, 54) == list(range(54))
+    assert replay.clock() == 1.0
+    with pytest.raises(OSError) as error:
+        replay.read_i2c_block_data(0x2D, 0x10, 6)
+    assert error.value.errno == errno.EIO
+    assert replay.clock() == 2.0
+    # Peeking moves the clock to the next burst without serving it
+    assert replay.peek()[0] == 3.0
+    assert replay.clock() == 3.0
+    assert replay.served == 2
+    with pytest.raises(ValueError):
+        replay.read_i2c_block_data(0x2D, 0x20, 4)
+    with pytest.raises(EOFError):
+        replay.read_i2c_block_data(0x2D, 0x20, 2)
+
+
+def test_replay_skip(tmp_path):
+    path = tmp_path / "capture"
+    _capture(path)
+    replay = ReplaySMBus(1, str(path))
+
+    replay.skip()
+
+    assert replay.served == 1
+    with pytest.raises(OSError):
+        replay.read_i2c_block_data(0x2D, 0x10, 6)
@@ -0,0 +1,333 @@
+"""Tests of a coordinator polling the emulated HAT."""
+
+import asyncio
+from collections.abc import Container
+from datetime import timedelta
+import errno
+from functools import partial
+
+from homeassistant.const import CONF_UNIQUE_ID
+from homeassistant.core import HomeAssistant
+import pytest
+import voluptuous as vol
+
+from custom_components.waveshare_ups_hat import CONFIG_SCHEMA
+from custom_components.waveshare_ups_hat.const import (
+    CONF_ADDR,
+    CONF_EMULATOR,
+    CONF_ERROR_RATE,
+    CONF_EXTERNAL_STATISTICS,
+    CONF_MAX_AGE,
+    CONF_POWER_WATCH_INTERVAL,
+    CONF_REFRESH,
+    CONF_SCAN_INTERVAL,
+    CONF_SCENARIO,
+    DOMAIN,
+    REG_CHARGING,
+)
+from custom_components.waveshare_ups_hat.coordinator import (
+    POWER_DEBOUNCE,
+    UpsHatECoordinator,
+    create_bus,
+)
+
+
+def _run(config_dir, options, test):
+    """Run the coroutine function test on the coordinator of a device config."""
+
+    async def run():
+        hass = HomeAssistant(str(config_dir))
+        config = CONFIG_SCHEMA({DOMAIN: options})[DOMAIN][0]
+        config[CONF_SCAN_INTERVAL] = timedelta(seconds=config[CONF_SCAN_INTERVAL])
+        bus = create_bus(hass, [config])
+        coordinator = UpsHatECoordinator(hass, config, bus)
+        try:
+            return await test(coordinator)
+        finally:
+            await bus.async_close()
+            await hass.async_stop(force=True)
+
+    return asyncio.run(run())
+
+
+def _poll(config_dir, emulator, polls=1) -> UpsHatECoordinator:
+    """Poll an emulated HAT and return its coordinator."""
+
+    async def test(coordinator):
+        for _ in range(polls):
+            await coordinator.async_refresh()
+        return coordinator
+
+    return _run(config_dir, {CONF_EMULATOR: emulator}, test)
+
+
+def _reads(coordinator, failing: Container = ()) -> list[tuple[int, int]]:
+    """Record the (register, length) burst reads, failing those in failing."""
+    reads = []
+    read_burst = coordinator._bus.read_burst
+
+    def read(addr, register, length):
+        reads.append((register, length))
+        if (register, length) in failing:
+            raise OSError(errno.EIO, "Emulated failure")
+        return read_burst(addr, register, length)
+
+    coordinator._bus.read_burst = read
+    return reads
+
+
+def test_listeners_are_notified_by_changed_key(tmp_path):
+    keys = (None, "soc", "battery_voltage")
+
+    async def test(coordinator):
+        await coordinator.async_refresh()
+        calls = []
+        for key in keys:
+            coordinator.async_add_listener(partial(calls.append, key), key)
+
+        coordinator.async_update_listeners()
+        unchanged = list(calls)
+        calls.clear()
+        coordinator.data = {**coordinator.data, "soc": 50}
+        coordinator.async_update_listeners()
+        changed = list(calls)
+        calls.clear()
+        coordinator.last_update_success = False
+        coordinator.async_update_listeners()
+        return unchanged, changed, calls
+
+    unchanged, changed, unavailable = _run(tmp_path, {CONF_EMULATOR: {}}, test)
+
+    # Listeners without a key are notified of every update
+    assert unchanged == [None]
+    assert changed == [None, "soc"]
+    # An availability change reaches every entity
+    assert unavailable == list(keys)
+
+
+def test_statistics_fold_each_poll_once(tmp_path, monkeypatch):
+    added = []
+
+    async def test(coordinator):
+        monkeypatch.setattr(
+            coordinator._statistics,
+            "async_add",
+            lambda now, stats: added.append(stats.count),
+        )
+        for _ in range(4):
+            await coordinator.async_refresh()
+
+    options = {CONF_EMULATOR: {}, CONF_EXTERNAL_STATISTICS: ["battery_voltage"]}
+    _run(tmp_path, options, test)
+
+    # The median window spans the last three polls; only the new one counts
+    assert added == [1, 1, 1, 1]
+
+
+def test_poll_decodes_the_emulated_hat(tmp_path):
+    coordinator = _poll(tmp_path, {CONF_SCENARIO: "discharge"})
+
+    assert coordinator.last_update_success
+    data = coordinator.data
+    assert data["online"] is False
+    assert data["charging"] is False
+    assert data["soc"] == 100
+    # Four full cells, drawing the emulated load
+    assert data["battery_voltage"] == pytest.approx(16.8)
+    assert data["cell1_voltage"] == pytest.approx(4.2)
+    assert data["battery_current"] == -1200
+    assert data["charger_voltage"] == 0
+    # On battery the remaining time is the time to empty: 4000 mAh at 1200 mA
+    assert data["remaining_time"] == 200
+    assert coordinator.runtime_left() == 200 * 60
+    # All registers in one burst read
+    assert sum(h.count for h in coordinator.metrics.latency.values()) == 1
+
+
+def test_poll_on_mains(tmp_path):
+    coordinator = _poll(tmp_path, {CONF_SCENARIO: "idle"})
+
+    data = coordinator.data
+    assert data["online"] is True
+    assert data["charger_voltage"] == pytest.approx(9.0)
+    assert data["battery_current"] == 0
+    assert coordinator.runtime_left() is None
+
+
+def test_no_runtime_before_the_power_state_is_read(tmp_path):
+    coordinator = _poll(tmp_path, {CONF_SCENARIO: "discharge"}, polls=0)
+    # As restored from the last snapshot
+    coordinator.data = {"remaining_time": 200}
+
+    assert coordinator.runtime_left() is None
+
+
+def test_shutdown_is_refused_without_a_polled_power_state(tmp_path):
+    async def test(coordinator):
+        # As restored from the last snapshot, on battery
+        coordinator.data = {"online": False, "remaining_time": 200}
+        before = await coordinator.shutdown()
+        await coordinator.async_refresh()
+        return before, await coordinator.shutdown()
+
+    before, polled = _run(tmp_path, {CONF_EMULATOR: {CONF_SCENARIO: "discharge"}}, test)
+
+    assert before is None
+    assert polled.confirmed
+
+
+def test_shutdown_is_refused_on_mains(tmp_path):
+    async def test(coordinator):
+        await coordinator.async_refresh()
+        return await coordinator.shutdown()
+
+    assert _run(tmp_path, {CONF_EMULATOR: {}}, test) is None
+
+
+def test_failed_reads_fail_the_update(tmp_path):
+    coordinator = _poll(tmp_path, {CONF_ERROR_RATE: 1.0})
+
+    assert not coordinator.last_update_success
+    assert sum(coordinator.metrics.errors.values()) > 0
+
+
+def test_failed_group_keeps_its_values_up_to_max_age(tmp_path):
+    async def test(coordinator):
+        now = [1000.0]
+        coordinator._clock = lambda: now[0]
+        failing = set()
+        _reads(coordinator, failing)
+        await coordinator.async_refresh()
+        voltage = coordinator.data["cell1_voltage"]
+
+        # The full burst and then the cells group fail
+        failing.update({(0x02, 54), (0x30, 8)})
+        now[0] += 30
+        await coordinator.async_refresh()
+        kept = coordinator.last_update_success, coordinator.data["cell1_voltage"]
+        stale = list(coordinator.diagnostics_dump()["stale_groups"])
+
+        now[0] += 30
+        await coordinator.async_refresh()
+        return voltage, kept, stale, coordinator.last_update_success
+
+    options = {CONF_EMULATOR: {}, CONF_MAX_AGE: 45}
+    voltage, kept, stale, expired = _run(tmp_path, options, test)
+
+    assert kept == (True, voltage)
+    assert stale == ["cells"]
+    # Older than max_age, the cells fail the update
+    assert not expired
+
+
+@pytest.mark.parametrize(
+    ("refresh", "reads"),
+    [
+        # Only the trailing group is skipped: one shorter burst
+        ({"cells": 300}, [(0x02, 42)]),
+        # A group between due ones splits the read around it
+        ({"capacity": 300}, [(0x02, 36), (0x30, 8)]),
+        ({"charger": 300, "battery": 300}, [(0x02, 1), (0x26, 18)]),
+    ],
+)
+def test_groups_are_refreshed_by_their_ttl(tmp_path, refresh, reads):
+    async def test(coordinator):
+        now = [1000.0]
+        coordinator._clock = lambda: now[0]
+        recorded = _reads(coordinator)
+        await coordinator.async_refresh()
+        first = list(recorded)
+        recorded.clear()
+        now[0] += 30
+        await coordinator.async_refresh()
+        second = list(recorded)
+        recorded.clear()
+        now[0] += 270
+        await coordinator.async_refresh()
+        return first, second, list(recorded)
+
+    first, second, due = _run(
+        tmp_path, {CONF_EMULATOR: {}, CONF_REFRESH: refresh}, test
+    )
+
+    assert first == [(0x02, 54)]
+    assert second == reads
+    assert due == [(0x02, 54)]
+
+
+def test_devices_on_a_bus_are_polled_in_one_batch(tmp_path):
+    devices = [
+        {CONF_UNIQUE_ID: "mains", CONF_EMULATOR: {CONF_SCENARIO: "idle"}},
+        {
+            CONF_UNIQUE_ID: "outage",
+            CONF_ADDR: "0x2e",
+            CONF_EMULATOR: {CONF_SCENARIO: "discharge"},
+        },
+    ]
+
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        configs = CONFIG_SCHEMA({DOMAIN: devices})[DOMAIN]
+        for config in configs:
+            config[CONF_SCAN_INTERVAL] = timedelta(seconds=config[CONF_SCAN_INTERVAL])
+        bus = create_bus(hass, configs)
+        coordinators = [UpsHatECoordinator(hass, config, bus) for config in configs]
+        try:
+            await asyncio.gather(*(c.async_refresh() for c in coordinators))
+            return bus.jobs, [c.data["online"] for c in coordinators]
+        finally:
+            await bus.async_close()
+            await hass.async_stop(force=True)
+
+    jobs, online = asyncio.run(run())
+
+    assert jobs == 1
+    # Each HAT runs the scenario of its own config
+    assert online == [True, False]
+
+
+def test_emulated_and_real_devices_do_not_share_a_bus():
+    devices = [
+        {CONF_UNIQUE_ID: "emulated", CONF_EMULATOR: {}},
+        {CONF_UNIQUE_ID: "real", CONF_ADDR: "0x2e"},
+    ]
+
+    with pytest.raises(vol.Invalid):
+        CONFIG_SCHEMA({DOMAIN: devices})
+
+
+def test_power_watch_publishes_debounced_edges(tmp_path):
+    # Mains lost, a one-read glitch back, then lost for good
+    statuses = [0x00, 0x20, *[0x00] * POWER_DEBOUNCE]
+
+    async def test(coordinator):
+        await coordinator.async_refresh()
+        read_block = coordinator._bus.read_block
+
+        def read(addr, register, length):
+            if register == REG_CHARGING and length == 1 and statuses:
+                return [statuses.pop(0)]
+            return read_block(addr, register, length)
+
+        online = []
+        published = asyncio.Event()
+
+        def listener():
+            online.append(coordinator.data["online"])
+            published.set()
+
+        coordinator.async_add_listener(listener, "online")
+        coordinator._bus.read_block = read
+        coordinator.async_start_power_watch()
+        try:
+            await asyncio.wait_for(published.wait(), 5)
+        finally:
+            coordinator.async_stop_power_watch()
+        return online, len(statuses)
+
+    options = {CONF_EMULATOR: {}, CONF_POWER_WATCH_INTERVAL: 0.01}
+    online, unread = _run(tmp_path, options, test)
+
+    # Published by the watcher, only once the reads agreed
+    assert online == [False]
+    assert unread == 0
@@ -0,0 +1,64 @@
+"""Tests of the register map decoders."""
+
+import struct
+
+from custom_components.waveshare_ups_hat.const import (
+    BURST_LENGTH,
+    REG_BATVOLTAGE,
+    REG_BURST_START,
+    REG_CHARGING,
+    REG_CURRENT,
+    REGISTERS,
+    RegisterField,
+)
+from custom_components.waveshare_ups_hat.coordinator import FIELD, WINDOWS, _compile
+
+
+def test_compile_pads_gaps_and_tail():
+    fields = (
+        RegisterField("a", 0x10, "h", 1, 0, None),
+        RegisterField("b", 0x14, "B", 1, 0, None),
+    )
+
+    decoder = _compile(fields, 0x0E, 10)
+
+    assert decoder.format == "<2xh2xB3x"
+    assert decoder.size == 10
+    assert decoder.unpack(bytes(range(10))) == (0x0302, 6)
+
+
+def test_compile_without_gaps():
+    fields = (
+        RegisterField("a", 0x20, "h", 1, 0, None),
+        RegisterField("b", 0x22, "H", 1, 0, None),
+    )
+
+    decoder = _compile(fields, 0x20, 4)
+
+    assert decoder.format == "<hH"
+    assert decoder.unpack(b"\xff\xff\xff\xff") == (-1, 0xFFFF)
+
+
+def test_burst_decoder_covers_the_register_map():
+    decoder = _compile(REGISTERS, REG_BURST_START, BURST_LENGTH)
+    burst = bytearray(BURST_LENGTH)
+    burst[REG_CHARGING - REG_BURST_START] = 0xA2
+    struct.pack_into("<h", burst, REG_BATVOLTAGE - REG_BURST_START, 16800)
+    struct.pack_into("<h", burst, REG_CURRENT - REG_BURST_START, -1200)
+
+    values = decoder.unpack(bytes(burst))
+
+    assert decoder.size == BURST_LENGTH
+    assert len(values) == len(REGISTERS)
+    assert values[FIELD["status"]] == 0xA2
+    assert values[FIELD["battery_voltage"]] == 16800
+    assert values[FIELD["battery_current"]] == -1200
+
+
+def test_windows_decode_only_their_fields():
+    for start, length, indices, decoder, _ in WINDOWS.values():
+        assert decoder.size == length
+        assert len(indices) == len(decoder.unpack(bytes(length)))
+        assert all(
+            start <= REGISTERS[index].address < start + length for index in indices
+        )
@@ -0,0 +1,113 @@
+"""Tests of the change-only state writes with a deadband and heartbeat."""
+
+from types import SimpleNamespace
+
+import pytest
+import voluptuous as vol
+
+from custom_components.waveshare_ups_hat import CONFIG_SCHEMA
+from custom_components.waveshare_ups_hat.const import CONF_DEADBAND, DOMAIN
+from custom_components.waveshare_ups_hat.entity import UpsHatEEntity
+
+KEY = "battery_voltage"
+
+
+@pytest.fixture
+def coordinator():
+    """Return the coordinator attributes the entity reads."""
+    return SimpleNamespace(
+        name_prefix="UPS HAT E",
+        id_prefix="ups_hat_e",
+        deadbands={KEY: (0.5, 0)},
+        heartbeat=600,
+        data={KEY: 15.0},
+        attributes={},
+        last_update_success=True,
+    )
+
+
+def _written(coordinator) -> UpsHatEEntity:
+    """Return an entity that has written the first value."""
+    entity = UpsHatEEntity(coordinator, "Battery Voltage", KEY)
+    assert entity._should_write()
+    return entity
+
+
+def test_unchanged_value_is_not_written(coordinator):
+    entity = _written(coordinator)
+
+    assert not entity._should_write()
+    assert not entity._held_back
+
+
+def test_change_within_deadband_is_held_back(coordinator):
+    entity = _written(coordinator)
+    coordinator.data[KEY] = 15.4
+
+    assert not entity._should_write()
+    assert entity._held_back
+    # Moving back to the written value leaves nothing held back
+    coordinator.data[KEY] = 15.0
+    assert not entity._should_write()
+    assert not entity._held_back
+
+
+def test_change_beyond_deadband_is_written(coordinator):
+    entity = _written(coordinator)
+    coordinator.data[KEY] = 15.6
+
+    assert entity._should_write()
+    # The deadband is measured from the last written value
+    coordinator.data[KEY] = 16.0
+    assert not entity._should_write()
+
+
+def test_relative_deadband(coordinator):
+    coordinator.deadbands[KEY] = (0, 10)
+    entity = _written(coordinator)
+
+    coordinator.data[KEY] = 16.5
+    assert not entity._should_write()
+    coordinator.data[KEY] = 16.6
+    assert entity._should_write()
+
+
+def test_heartbeat_writes_held_back_change(coordinator):
+    entity = _written(coordinator)
+    coordinator.data[KEY] = 15.2
+
+    assert not entity._should_write()
+    assert entity._should_write(heartbeat_due=True)
+    assert not entity._held_back
+
+
+def test_change_after_heartbeat_is_written(coordinator):
+    entity = _written(coordinator)
+    entity._written_at -= coordinator.heartbeat
+    coordinator.data[KEY] = 15.2
+
+    assert entity._should_write()
+
+
+def test_availability_change_is_always_written(coordinator):
+    entity = _written(coordinator)
+    coordinator.last_update_success = False
+    coordinator.data[KEY] = 15.1
+
+    assert entity._should_write()
+
+
+def test_without_deadband_every_change_is_written(coordinator):
+    coordinator.deadbands = {}
+    entity = _written(coordinator)
+    coordinator.data[KEY] = 15.01
+
+    assert entity._should_write()
+
+
+def test_deadband_keys_are_validated():
+    config = CONFIG_SCHEMA({DOMAIN: {CONF_DEADBAND: {KEY: {"absolute": 0.1}}}})
+    assert config[DOMAIN][0][CONF_DEADBAND] == {KEY: {"absolute": 0.1, "relative": 0}}
+
+    with pytest.raises(vol.Invalid):
+        CONFIG_SCHEMA({DOMAIN: {CONF_DEADBAND: {"battery_votlage": {"absolute": 0.1}}}})
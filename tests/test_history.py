@@ -0,0 +1,72 @@
+"""Tests of the on-disk history."""
+
+from math import inf
+
+from custom_components.waveshare_ups_hat.history import (
+    HEADER_SIZE,
+    KIND_POLL,
+    KIND_SAMPLE,
+    MAGIC,
+    History,
+)
+
+
+def _history(path, fields="hH", capacity=3) -> History:
+    history = History(str(path), fields, capacity)
+    history.open()
+    return history
+
+
+def test_history_file_layout(tmp_path):
+    path = tmp_path / "history"
+    history = _history(path)
+    history.close()
+
+    data = path.read_bytes()
+    assert data[:4] == MAGIC
+    # Header, then capacity records of timestamp, kind and the fields
+    assert len(data) == HEADER_SIZE + 3 * (8 + 1 + 2 + 2)
+
+
+def test_history_keeps_the_latest_records_in_order(tmp_path):
+    history = _history(tmp_path / "history")
+    for i in range(5):
+        history.append(100.0 + i, KIND_POLL if i % 2 else KIND_SAMPLE, (-i, i))
+
+    snapshot = history.snapshot()
+    history.close()
+
+    assert list(snapshot.records(-inf, inf)) == [
+        (102.0, KIND_SAMPLE, -2, 2),
+        (103.0, KIND_POLL, -3, 3),
+        (104.0, KIND_SAMPLE, -4, 4),
+    ]
+    assert list(snapshot.records(103.0, 103.5)) == [(103.0, KIND_POLL, -3, 3)]
+
+
+def test_history_survives_a_reopen(tmp_path):
+    path = tmp_path / "history"
+    history = _history(path)
+    history.append(1.0, KIND_POLL, (1, 2))
+    history.close()
+
+    reopened = _history(path)
+    reopened.append(2.0, KIND_POLL, (3, 4))
+
+    assert [record[0] for record in reopened.snapshot().records(-inf, inf)] == [
+        1.0,
+        2.0,
+    ]
+    reopened.close()
+
+
+def test_history_starts_over_on_a_new_layout(tmp_path):
+    path = tmp_path / "history"
+    history = _history(path)
+    history.append(1.0, KIND_POLL, (1, 2))
+    history.close()
+
+    changed = _history(path, fields="hHh")
+
+    assert changed.snapshot().data == b""
+    changed.close()
@@ -0,0 +1,109 @@
+"""Tests of the hourly long-term statistics."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from homeassistant.core import HomeAssistant
+import pytest
+
+from custom_components.waveshare_ups_hat import longterm
+from custom_components.waveshare_ups_hat.longterm import LongTermStatistics
+from custom_components.waveshare_ups_hat.ringbuffer import WindowStats
+
+HOUR = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+# Battery voltage in mV, reported in V with two decimals
+CHANNELS = {"battery_voltage": (0, 1000, 2, "V")}
+
+
+@pytest.fixture
+def imported(monkeypatch):
+    """Return the statistics imported, as (statistic_id, data) pairs."""
+    imports = []
+    monkeypatch.setattr(
+        longterm,
+        "async_add_external_statistics",
+        lambda hass, metadata, data: imports.extend(
+            (metadata["statistic_id"], row) for row in data
+        ),
+    )
+    return imports
+
+
+def _stats(*rows: int) -> WindowStats:
+    """Return the statistics of rows of the one channel."""
+    return WindowStats(
+        len(rows), [sum(rows) / len(rows)], [min(rows)], [max(rows)], [[0]]
+    )
+
+
+def _run(config_dir, test):
+    """Run the coroutine function test on Home Assistant with the recorder."""
+
+    async def run():
+        hass = HomeAssistant(str(config_dir))
+        hass.config.components.add("recorder")
+        try:
+            return await test(hass)
+        finally:
+            await hass.async_stop(force=True)
+
+    return asyncio.run(run())
+
+
+def _statistics(hass) -> LongTermStatistics:
+    return LongTermStatistics(hass, "ups_hat_e", "UPS HAT E", CHANNELS)
+
+
+def test_hour_is_imported_when_it_rolls_over(tmp_path, imported):
+    async def test(hass):
+        statistics = _statistics(hass)
+        statistics.async_add(HOUR, _stats(16000, 16400))
+        statistics.async_add(HOUR + timedelta(minutes=30), _stats(16600))
+        assert not imported
+        statistics.async_add(HOUR + timedelta(hours=1), _stats(16000))
+
+    _run(tmp_path, test)
+
+    ((statistic_id, row),) = imported
+    assert statistic_id == "waveshare_ups_hat:ups_hat_e_battery_voltage"
+    assert row["start"] == HOUR
+    # Weighted by the rows of each poll
+    assert row["mean"] == pytest.approx(16.33)
+    assert row["min"] == pytest.approx(16.0)
+    assert row["max"] == pytest.approx(16.6)
+
+
+def test_hour_survives_a_restart(tmp_path, imported):
+    async def before(hass):
+        statistics = _statistics(hass)
+        statistics.async_add(HOUR, _stats(16000))
+        await statistics.async_close()
+
+    async def after(hass):
+        statistics = _statistics(hass)
+        await statistics.async_restore()
+        statistics.async_add(HOUR + timedelta(minutes=30), _stats(17000))
+        await statistics.async_close()
+
+    _run(tmp_path, before)
+    _run(tmp_path, after)
+
+    # Imported at each stop, the second time with the samples from before
+    # the restart as well
+    assert [row["start"] for _, row in imported] == [HOUR, HOUR]
+    row = imported[-1][1]
+    assert row["mean"] == pytest.approx(16.5)
+    assert row["min"] == pytest.approx(16.0)
+    assert row["max"] == pytest.approx(17.0)
+
+
+def test_nothing_is_imported_without_the_recorder(tmp_path, imported):
+    async def test(hass):
+        hass.config.components.discard("recorder")
+        statistics = _statistics(hass)
+        statistics.async_add(HOUR, _stats(16000))
+        statistics.async_flush()
+
+    _run(tmp_path, test)
+
+    assert not imported
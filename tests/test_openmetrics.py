@@ -0,0 +1,117 @@
+"""Tests of the metrics endpoint."""
+
+import asyncio
+from datetime import timedelta
+
+from homeassistant.core import HomeAssistant
+import pytest
+
+from custom_components.waveshare_ups_hat import CONFIG_SCHEMA
+from custom_components.waveshare_ups_hat.const import (
+    CONF_EMULATOR,
+    CONF_SCAN_INTERVAL,
+    CONF_SCENARIO,
+    DOMAIN,
+)
+from custom_components.waveshare_ups_hat.coordinator import (
+    UpsHatECoordinator,
+    create_bus,
+)
+from custom_components.waveshare_ups_hat.openmetrics import (
+    CONTENT_TYPE,
+    OpenMetricsView,
+    render,
+)
+
+DEVICE = 'unique_id="ups_hat_e"'
+
+
+def _scrape(config_dir, polls=2):
+    """Poll an emulated HAT on battery; return its metrics, data and response."""
+
+    async def run():
+        hass = HomeAssistant(str(config_dir))
+        options = {CONF_EMULATOR: {CONF_SCENARIO: "discharge"}}
+        config = CONFIG_SCHEMA({DOMAIN: options})[DOMAIN][0]
+        config[CONF_SCAN_INTERVAL] = timedelta(seconds=config[CONF_SCAN_INTERVAL])
+        bus = create_bus(hass, [config])
+        coordinator = UpsHatECoordinator(hass, config, bus)
+        try:
+            for _ in range(polls):
+                await coordinator.async_refresh()
+            response = await OpenMetricsView([coordinator]).get(None)
+            return render([coordinator]), coordinator, response
+        finally:
+            await bus.async_close()
+            await hass.async_stop(force=True)
+
+    return asyncio.run(run())
+
+
+def _samples(text: str) -> dict[str, float]:
+    """Return the value of every sample line by its name and labels."""
+    return {
+        line.rpartition(" ")[0]: float(line.rpartition(" ")[2])
+        for line in text.splitlines()
+        if not line.startswith("#")
+    }
+
+
+def test_samples_in_base_units(tmp_path):
+    text, coordinator, response = _scrape(tmp_path)
+    samples = _samples(text)
+    data = coordinator.data
+
+    assert response.headers["Content-Type"] == CONTENT_TYPE
+    assert samples[f"{DOMAIN}_up{{{DEVICE}}}"] == 1
+    assert samples[f"{DOMAIN}_online{{{DEVICE}}}"] == 0
+    assert samples[f"{DOMAIN}_state_of_charge_percent{{{DEVICE}}}"] == data["soc"]
+    assert samples[f"{DOMAIN}_battery_voltage_volts{{{DEVICE}}}"] == pytest.approx(
+        data["battery_voltage"]
+    )
+    assert samples[f"{DOMAIN}_battery_current_amperes{{{DEVICE}}}"] == pytest.approx(
+        data["battery_current"] / 1000
+    )
+    # The cells share one metric, told apart by a cell label
+    for cell in range(1, coordinator.cells + 1):
+        assert samples[
+            f'{DOMAIN}_cell_voltage_volts{{{DEVICE},cell="{cell}"}}'
+        ] == pytest.approx(data[f"cell{cell}_voltage"])
+    assert f'cell="{coordinator.cells + 1}"' not in text
+
+
+def test_window_statistics(tmp_path):
+    text, coordinator, _ = _scrape(tmp_path)
+    samples = _samples(text)
+
+    voltage = coordinator.data["battery_voltage"]
+    for stat in ("median", "mean", "min", "max"):
+        labels = f'{DEVICE},stat="{stat}"'
+        assert samples[
+            f"{DOMAIN}_battery_voltage_window_volts{{{labels}}}"
+        ] == pytest.approx(voltage, rel=0.01)
+
+
+def test_families_and_histograms(tmp_path):
+    text, coordinator, _ = _scrape(tmp_path)
+    lines = text.splitlines()
+
+    # Every family is announced once, right before its samples
+    families = [line.split()[2] for line in lines if line.startswith("# TYPE")]
+    assert len(families) == len(set(families))
+    for index, line in enumerate(lines):
+        if line.startswith("# TYPE"):
+            assert lines[index + 1].startswith(line.split()[2])
+
+    # Cumulative buckets ending with the count, for every transaction
+    samples = _samples(text)
+    family = f"{DOMAIN}_bus_transaction_seconds"
+    for register, length in coordinator.metrics.latency:
+        labels = f'{DEVICE},register="{register:#04x}",length="{length}"'
+        buckets = [
+            value
+            for name, value in samples.items()
+            if name.startswith(f"{family}_bucket{{{labels},")
+        ]
+        assert buckets == sorted(buckets)
+        assert buckets[-1] == samples[f"{family}_count{{{labels}}}"] > 0
@@ -0,0 +1,114 @@
+"""Tests of the learned discharge curve."""
+
+import pytest
+
+from custom_components.waveshare_ups_hat.predictor import (
+    MIN_OBSERVATIONS,
+    DischargeModel,
+)
+
+
+def _discharged(model: DischargeModel, soc: int, steps: int, wh: float) -> float:
+    """Discharge steps whole percents from soc at wh per percent.
+
+    The discharge starts partway through the percent above soc. Return
+    the energy discharged.
+    """
+    model.observe(soc + 1, 0.0, True)
+    model.observe(soc, wh / 2, True)
+    for step in range(1, steps + 1):
+        model.observe(soc - step, wh / 2 + step * wh, True)
+    return wh / 2 + steps * wh
+
+
+def test_no_prediction_until_learned():
+    model = DischargeModel()
+    discharged = _discharged(model, 99, MIN_OBSERVATIONS - 1, 1.0)
+
+    assert model.predict(50, 10.0) is None
+    model.observe(99 - MIN_OBSERVATIONS, discharged + 1.0, True)
+    assert model.predict(50, 10.0) is not None
+
+
+def test_prediction_from_a_steady_discharge():
+    model = DischargeModel()
+    _discharged(model, 99, 10, 1.0)
+
+    prediction = model.predict(50, 10.0)
+
+    assert model.observations == 10
+    # 50 Wh left, unobserved bins at the learned mean, drawn at 10 W
+    assert prediction.minutes == pytest.approx(300)
+    assert prediction.lower == pytest.approx(300)
+    assert prediction.upper == pytest.approx(300)
+
+
+def test_no_prediction_without_discharge_power():
+    model = DischargeModel()
+    _discharged(model, 99, 10, 1.0)
+
+    assert model.predict(50, 0.0) is None
+
+
+def test_first_step_after_an_anchor_is_discarded():
+    model = DischargeModel()
+    model.observe(100, 0.0, True)
+
+    # Partway through the percent the discharge started in
+    assert not model.observe(99, 0.3, True)
+    assert model.observations == 0
+    assert model.observe(98, 1.3, True)
+    assert model.as_dict()["mean"][-1] == pytest.approx(1.0)
+
+
+def test_energy_is_spread_over_the_percents_crossed():
+    model = DischargeModel()
+    model.observe(100, 0.0, True)
+    model.observe(99, 0.5, True)
+
+    assert model.observe(96, 6.5, True)
+    assert model.observations == 3
+    assert model.as_dict()["mean"][-1] == pytest.approx(2.0)
+
+
+def test_bounds_widen_with_spread():
+    model = DischargeModel()
+    discharged = 0.0
+    model.observe(101, discharged, True)
+    model.observe(100, discharged, True)
+    for step, wh in enumerate((1.0, 3.0, 1.0, 3.0, 1.0, 3.0), start=1):
+        discharged += wh
+        model.observe(100 - step, discharged, True)
+
+    prediction = model.predict(100, 10.0)
+
+    # 2 Wh per percent, one standard deviation of sqrt(1.2) Wh per
+    # percent over the ten percents of the observed bin
+    spread = 10 * 1.2**0.5
+    assert prediction.minutes == pytest.approx(200 * 6)
+    assert prediction.lower == pytest.approx((200 - spread) * 6)
+    assert prediction.upper == pytest.approx((200 + spread) * 6)
+
+
+def test_interruptions_restart_the_measurement():
+    model = DischargeModel()
+    model.observe(100, 0.0, True)
+    model.observe(90, 5.0, False)
+
+    assert not model.observe(80, 50.0, True)
+    assert model.observations == 0
+    # A SoC going up anchors the measurement again
+    assert not model.observe(85, 51.0, True)
+    assert not model.observe(84, 51.5, True)
+    assert model.observe(83, 52.5, True)
+    assert model.observations == 1
+
+
+def test_stored_model():
+    model = DischargeModel()
+    _discharged(model, 99, 10, 1.0)
+
+    restored = DischargeModel(model.as_dict())
+
+    assert restored.observations == model.observations
+    assert restored.predict(50, 10.0) == model.predict(50, 10.0)
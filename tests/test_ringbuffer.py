@@ -0,0 +1,89 @@
+"""Tests of the ring buffer statistics, with and without NumPy."""
+
+import pytest
+
+from custom_components.waveshare_ups_hat import ringbuffer
+from custom_components.waveshare_ups_hat.ringbuffer import RingBuffer
+
+ROWS = ([3, -5], [1, 7], [4, 0], [1, 2], [5, -9])
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    """Run a test on the NumPy block and on the array('i') fallback."""
+    if request.param == "python":
+        monkeypatch.setattr(ringbuffer, "np", None)
+    return request.param
+
+
+def _filled(size: int) -> RingBuffer:
+    buffer = RingBuffer(2, size)
+    for row in ROWS:
+        buffer.append(row)
+    return buffer
+
+
+def test_stats(backend):
+    stats = _filled(5).stats((10, 50, 90))
+
+    assert stats.count == 5
+    assert stats.mean == pytest.approx([2.8, -1.0])
+    assert stats.minimum == [1, -9]
+    assert stats.maximum == [5, 7]
+    # Linearly interpolated between the closest ranks, like numpy.percentile
+    assert stats.percentiles[0] == pytest.approx([1.0, -7.4])
+    assert stats.percentiles[1] == pytest.approx([3.0, 0.0])
+    assert stats.percentiles[2] == pytest.approx([4.6, 5.0])
+
+
+def test_wraps_to_the_latest_rows(backend):
+    buffer = _filled(3)
+
+    stats = buffer.stats()
+    assert len(buffer) == 3
+    assert stats.mean == pytest.approx([10 / 3, -7 / 3])
+    assert stats.minimum == [1, -9]
+    assert stats.maximum == [5, 2]
+    assert stats.percentiles[0] == pytest.approx([4.0, 0.0])
+
+
+def test_even_count_median(backend):
+    buffer = RingBuffer(1, 4)
+    for value in (4, 1, 3, 2):
+        buffer.append([value])
+
+    assert buffer.stats().percentiles[0] == pytest.approx([2.5])
+
+
+def test_clear(backend):
+    buffer = _filled(5)
+    buffer.clear()
+
+    assert len(buffer) == 0
+    with pytest.raises(ValueError):
+        buffer.stats()
+    buffer.append([7, 8])
+    assert buffer.stats().mean == pytest.approx([7.0, 8.0])
+
+
+def test_fallback_matches_numpy(monkeypatch):
+    pytest.importorskip("numpy")
+    percentiles = (5, 25, 50, 75, 95)
+    rows = [[(i * 37) % 101 - 50, (i * i) % 17] for i in range(23)]
+
+    def stats():
+        buffer = RingBuffer(2, 16)
+        for row in rows:
+            buffer.append(row)
+        return buffer.stats(percentiles)
+
+    expected = stats()
+    monkeypatch.setattr(ringbuffer, "np", None)
+    actual = stats()
+
+    assert actual.count == expected.count
+    assert actual.mean == pytest.approx(expected.mean)
+    assert actual.minimum == expected.minimum
+    assert actual.maximum == expected.maximum
+    for ours, theirs in zip(actual.percentiles, expected.percentiles):
+        assert ours == pytest.approx(theirs)
@@ -0,0 +1,125 @@
+"""Tests of the shutdown command timing as Home Assistant stops."""
+
+import asyncio
+
+from homeassistant.const import (
+    ATTR_DOMAIN,
+    ATTR_SERVICE,
+    EVENT_CALL_SERVICE,
+    EVENT_HOMEASSISTANT_STOP,
+    RESTART_EXIT_CODE,
+)
+from homeassistant.core import HomeAssistant
+import pytest
+
+from custom_components.waveshare_ups_hat import shutdown
+from custom_components.waveshare_ups_hat.shutdown import (
+    POWER_OFF_DELAY,
+    SAFETY_MARGIN,
+    ShutdownOrchestrator,
+)
+
+# Seconds Home Assistant takes to stop, on the fake clock
+STOP_DURATION = 20.0
+HOST_SHUTDOWN = (
+    EVENT_CALL_SERVICE,
+    {ATTR_DOMAIN: "hassio", ATTR_SERVICE: "host_shutdown"},
+)
+
+
+@pytest.fixture
+def planned(monkeypatch):
+    """Return the early sends planned, as (delay, action) pairs."""
+    calls = []
+
+    def call_later(hass, delay, action):
+        calls.append((delay, action))
+        return lambda: calls.remove((delay, action))
+
+    monkeypatch.setattr(shutdown, "async_call_later", call_later)
+    return calls
+
+
+def _stop(config_dir, planned, runtime, exit_code=0, supervisor=False, events=()):
+    """Stop Home Assistant and return the times the command was sent at.
+
+    runtime is the battery runtime left, None on mains. The events are
+    fired before the stop. A fake clock runs through the stop, running
+    the early sends planned as they come due.
+    """
+
+    async def run():
+        hass = HomeAssistant(str(config_dir))
+        if supervisor:
+            hass.config.components.add("hassio")
+        now = [0.0]
+        sent = []
+
+        async def send():
+            sent.append(now[0])
+            orchestrator.async_command_sent()
+
+        orchestrator = ShutdownOrchestrator(hass, "ups_hat_e", send, lambda: runtime)
+        orchestrator.clock = lambda: now[0]
+        await orchestrator.async_setup()
+        for event_type, data in events:
+            hass.bus.async_fire(event_type, data)
+
+        async def stopping(event):
+            for delay, action in sorted(planned, key=lambda call: call[0]):
+                if delay <= STOP_DURATION:
+                    now[0] = delay
+                    await action(None)
+            now[0] = STOP_DURATION
+
+        # After the orchestrator's own listener, which plans the early send
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, stopping)
+        await hass.async_stop(exit_code, force=True)
+        return sent
+
+    return asyncio.run(run())
+
+
+def test_command_is_sent_as_home_assistant_closes(tmp_path, planned):
+    assert _stop(tmp_path, planned, runtime=3600) == [STOP_DURATION]
+    assert not planned
+
+
+def test_command_is_sent_early_on_a_short_runtime(tmp_path, planned):
+    # Learn how long a stop takes
+    _stop(tmp_path, planned, runtime=3600)
+
+    # The HAT has to cut power 10 s into the next stop
+    runtime = POWER_OFF_DELAY + SAFETY_MARGIN + 10
+    assert _stop(tmp_path, planned, runtime) == [10]
+
+
+def test_command_is_sent_at_once_when_the_battery_is_almost_empty(tmp_path, planned):
+    assert _stop(tmp_path, planned, runtime=SAFETY_MARGIN) == [0]
+
+
+def test_restart_sends_no_command(tmp_path, planned):
+    assert _stop(tmp_path, planned, runtime=60, exit_code=RESTART_EXIT_CODE) == []
+    assert not planned
+
+
+def test_supervisor_restart_sends_no_command(tmp_path, planned):
+    # Other service calls do not count
+    events = [(EVENT_CALL_SERVICE, {ATTR_DOMAIN: "light", ATTR_SERVICE: "turn_on"})]
+
+    assert _stop(tmp_path, planned, 3600, supervisor=True, events=events) == []
+
+
+def test_supervisor_host_shutdown_sends_the_command(tmp_path, planned):
+    events = [HOST_SHUTDOWN]
+
+    sent = _stop(tmp_path, planned, 3600, supervisor=True, events=events)
+
+    assert sent == [STOP_DURATION]
+
+
+def test_command_is_left_to_the_device_on_mains(tmp_path, planned):
+    # Without a runtime nothing is planned; the send at close is refused
+    # by the coordinator on mains or with stale data
+    assert _stop(tmp_path, planned, runtime=None) == [STOP_DURATION]
+    assert not planned